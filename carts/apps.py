@@ -5,3 +5,6 @@ class CartsConfig(AppConfig):
     default_auto_field = 'django.db.models.BigAutoField'
     name = 'carts'
     verbose_name = 'Корзины'
+
+    def ready(self):
+        import carts.signals  # noqa: F401
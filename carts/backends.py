@@ -0,0 +1,278 @@
+from django.conf import settings
+from django.db import transaction
+
+from carts.models import CART_MAX_QUANTITY, Cart
+from goods.models import Products
+
+
+# Ключ сессии, под которым хранится анонимная корзина
+SESSION_CART_KEY = 'cart'
+
+
+class DbCart:
+    """
+    Корзина, хранящаяся в таблице cart.
+
+    Используется для авторизованных пользователей и для анонимных
+    посетителей при CART_ANONYMOUS_BACKEND = 'db'. Строки корзины
+    адресуются по id строки.
+
+    Args:
+        user (User, optional): Владелец корзины.
+        session_key (str, optional): Ключ сессии анонимной корзины.
+    """
+
+    def __init__(self, user=None, session_key=None):
+        self.user = user
+        self.session_key = session_key
+
+    @property
+    def owner_lines(self):
+        if self.user is not None:
+            return Cart.objects.filter(user=self.user)
+        return Cart.objects.filter(session_key=self.session_key)
+
+    @property
+    def queryset(self):
+        return self.owner_lines.select_related('product')
+
+    def lines(self):
+        """
+        Возвращает строки корзины вместе с товарами.
+
+        Набор загружается одним запросом при первом переборе; если строки
+        не перебирались, итоги считаются одним aggregate() (см.
+        CartQueryset.totals()).
+        """
+        return self.queryset
+
+    def add(self, product_id, quantity=1):
+        """
+        Добавляет товар в корзину.
+
+        Returns:
+            int | None: id строки корзины или None, если товара нет.
+        """
+        line = Cart.objects.add_product(
+            product_id, user=self.user, session_key=self.session_key,
+            quantity=quantity)
+        return line[0] if line else None
+
+    def line_product_id(self, line_id):
+        """
+        Возвращает id товара строки корзины или None, если строки нет.
+        """
+        return self.owner_lines.filter(id=line_id).values_list(
+            'product_id', flat=True).first()
+
+    def set(self, line_id, quantity):
+        """
+        Задает количество товара в строке корзины.
+
+        Returns:
+            bool: True, если строка найдена.
+        """
+        return bool(self.queryset.filter(id=line_id).update(
+            quantity=quantity))
+
+    def remove(self, line_id):
+        """
+        Удаляет строку корзины.
+
+        Returns:
+            int | None: Удаленное количество или None, если строки нет.
+        """
+        lines = self.queryset.filter(id=line_id)
+        quantity = lines.values_list('quantity', flat=True).first()
+        if quantity is not None:
+            lines.delete()
+        return quantity
+
+    def apply(self, increments, quantities, removals):
+        """
+        Применяет пакет изменений корзины в одной транзакции.
+
+        Независимо от размера пакета выполняет не больше трех запросов:
+        INSERT ... ON CONFLICT для добавлений, такой же запрос для
+        установки количества и DELETE для удалений.
+
+        Args:
+            increments (dict): На сколько увеличить количество, по id
+                               товара.
+            quantities (dict): Новое количество по id товара.
+            removals (set): id товаров, удаляемых из корзины.
+        """
+        owner = {'user': self.user, 'session_key': self.session_key}
+        with transaction.atomic():
+            Cart.objects.upsert_lines(increments, **owner)
+            Cart.objects.upsert_lines(quantities, increment=False, **owner)
+            if removals:
+                self.owner_lines.filter(product_id__in=removals).delete()
+
+
+def _capped(quantity):
+    return max(1, min(int(quantity), CART_MAX_QUANTITY))
+
+
+class SessionCart:
+    """
+    Анонимная корзина в сессии посетителя.
+
+    Хранит компактный словарь {id товара: количество} и не создает строк
+    в таблице cart; сессия создается только при первом добавлении товара.
+    Количество ограничивается CART_MAX_QUANTITY, как и поле Cart.quantity,
+    поэтому корзина переносится в БД без переполнения.
+    Строки корзины собираются из словаря как несохраненные объекты Cart,
+    id которых совпадает с id товара, поэтому шаблоны и представления
+    работают с ними так же, как со строками из БД. При входе в аккаунт
+    корзина переносится в БД методом materialize().
+
+    Args:
+        session (SessionBase): Сессия текущего запроса.
+    """
+
+    def __init__(self, session):
+        self.session = session
+
+    @property
+    def items(self):
+        return self.session.get(SESSION_CART_KEY, {})
+
+    def _save(self, items):
+        if items:
+            self.session[SESSION_CART_KEY] = items
+        else:
+            self.session.pop(SESSION_CART_KEY, None)
+
+    def lines(self):
+        """
+        Возвращает строки корзины; товары загружаются одним запросом,
+        пустая корзина обходится без запросов.
+        """
+        items = self.items
+        if not items:
+            return []
+        products = Products.objects.in_bulk(
+            [int(product_id) for product_id in items])
+        return [
+            Cart(id=product.id, product=product, quantity=quantity)
+            for product_id, quantity in items.items()
+            if (product := products.get(int(product_id))) is not None
+        ]
+
+    def add(self, product_id, quantity=1):
+        """
+        Добавляет товар в корзину.
+
+        Returns:
+            int | None: id строки (совпадает с id товара) или None, если
+                        товара нет.
+        """
+        if not Products.objects.filter(id=product_id).exists():
+            return None
+        items = dict(self.items)
+        key = str(product_id)
+        items[key] = _capped(items.get(key, 0) + quantity)
+        self._save(items)
+        return product_id
+
+    def line_product_id(self, line_id):
+        """
+        Возвращает id товара строки корзины (он же id строки) или None,
+        если товара нет в корзине.
+        """
+        return line_id if str(line_id) in self.items else None
+
+    def set(self, line_id, quantity):
+        """
+        Задает количество товара в строке корзины.
+
+        Returns:
+            bool: True, если товар есть в корзине.
+        """
+        items = dict(self.items)
+        key = str(line_id)
+        if key not in items:
+            return False
+        items[key] = _capped(quantity)
+        self._save(items)
+        return True
+
+    def remove(self, line_id):
+        """
+        Удаляет товар из корзины.
+
+        Returns:
+            int | None: Удаленное количество или None, если товара нет.
+        """
+        items = dict(self.items)
+        quantity = items.pop(str(line_id), None)
+        if quantity is not None:
+            self._save(items)
+        return quantity
+
+    def apply(self, increments, quantities, removals):
+        """
+        Применяет пакет изменений корзины; существование добавляемых
+        товаров проверяется одним запросом.
+
+        Args:
+            increments (dict): На сколько увеличить количество, по id
+                               товара.
+            quantities (dict): Новое количество по id товара.
+            removals (set): id товаров, удаляемых из корзины.
+        """
+        existing = set(Products.objects.filter(
+            id__in=[*increments, *quantities]).values_list('id', flat=True))
+        items = dict(self.items)
+        for product_id, quantity in increments.items():
+            if product_id in existing:
+                key = str(product_id)
+                items[key] = _capped(items.get(key, 0) + quantity)
+        for product_id, quantity in quantities.items():
+            if product_id in existing:
+                items[str(product_id)] = _capped(quantity)
+        for product_id in removals:
+            items.pop(str(product_id), None)
+        self._save(items)
+
+    def materialize(self, user):
+        """
+        Переносит корзину в БД пользователю одним запросом и очищает ее.
+
+        Количество товаров, уже лежащих в корзине пользователя,
+        увеличивается на количество из сессии.
+
+        Args:
+            user (User): Пользователь, вошедший в аккаунт.
+        """
+        items = self.items
+        if items:
+            Cart.objects.upsert_lines(
+                {int(product_id): _capped(quantity)
+                 for product_id, quantity in items.items()},
+                user=user)
+            self._save({})
+
+
+def anonymous_carts_in_session():
+    return getattr(settings, 'CART_ANONYMOUS_BACKEND', 'session') == 'session'
+
+
+def get_cart_backend(request):
+    """
+    Возвращает хранилище корзины текущего пользователя или посетителя.
+
+    Args:
+        request (HttpRequest): объект запроса от пользователя.
+
+    Returns:
+        DbCart | SessionCart: Хранилище корзины.
+    """
+    if request.user.is_authenticated:
+        return DbCart(user=request.user)
+    if anonymous_carts_in_session():
+        return SessionCart(request.session)
+    if not request.session.session_key:
+        request.session.create()
+    return DbCart(session_key=request.session.session_key)
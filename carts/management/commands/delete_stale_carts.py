@@ -0,0 +1,34 @@
+from datetime import timedelta
+
+from carts.utils import delete_stale_carts
+from marmalade_shop.batches import BatchCommand
+
+
+class Command(BatchCommand):
+    """
+    Команда для удаления брошенных анонимных корзин.
+
+    Удаляет строки корзины без пользователя, сессия которых истекла, или
+    которые старше заданного возраста. Работает короткими пакетами по
+    индексам анонимных корзин, поэтому ее можно запускать на работающем
+    магазине, например по cron.
+    """
+    help = 'Удаляет брошенные анонимные корзины пакетами'
+    progress_label = 'Удалено строк'
+    done_message = ('Брошенные корзины удалены, всего строк: {total}, '
+                    'за {elapsed:.2f} с')
+
+    def add_arguments(self, parser):
+        super().add_arguments(parser)
+        parser.add_argument(
+            '--max-age-days', type=int, default=None,
+            help='Максимальный возраст анонимной строки корзины в днях '
+                 '(по умолчанию SESSION_COOKIE_AGE)')
+
+    def process(self, batch_size, pause, progress, **options):
+        max_age = None
+        if options['max_age_days'] is not None:
+            max_age = timedelta(days=options['max_age_days'])
+        return delete_stale_carts(
+            max_age=max_age, batch_size=batch_size, pause=pause,
+            progress=progress)
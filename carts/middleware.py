@@ -0,0 +1,18 @@
+from carts.utils import RequestCart
+
+
+class CartMiddleware:
+    """
+    Middleware, добавляющий к запросу корзину текущего пользователя.
+
+    Корзина доступна как request.cart и загружается лениво, только при
+    первом обращении, поэтому страницы без корзины не выполняют запросов.
+    Должен подключаться после AuthenticationMiddleware.
+    """
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        request.cart = RequestCart(request)
+        return self.get_response(request)
@@ -0,0 +1,44 @@
+# Generated by Django 4.2.11 on 2026-10-18 15:14
+
+from django.db import migrations, models
+from django.db.models import Count, Min, Sum
+
+
+def merge_duplicate_lines(apps, schema_editor):
+    """
+    Сливает повторяющиеся строки корзины перед созданием уникальных
+    индексов: остается строка с меньшим id и суммой количеств.
+    """
+    Cart = apps.get_model('carts', 'Cart')
+    for owner in ('user', 'session_key'):
+        duplicates = (
+            Cart.objects.filter(**{f'{owner}__isnull': False})
+            .values(owner, 'product')
+            .annotate(lines=Count('id'), keep_id=Min('id'),
+                      total=Sum('quantity'))
+            .filter(lines__gt=1)
+        )
+        for group in duplicates:
+            lines = Cart.objects.filter(
+                **{owner: group[owner], 'product': group['product']})
+            lines.exclude(id=group['keep_id']).delete()
+            lines.update(quantity=group['total'])
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('carts', '0001_initial'),
+    ]
+
+    operations = [
+        migrations.RunPython(merge_duplicate_lines, migrations.RunPython.noop),
+        migrations.AddConstraint(
+            model_name='cart',
+            constraint=models.UniqueConstraint(condition=models.Q(('user__isnull', False)), fields=('user', 'product'), name='cart_user_product_unique'),
+        ),
+        migrations.AddConstraint(
+            model_name='cart',
+            constraint=models.UniqueConstraint(condition=models.Q(('session_key__isnull', False)), fields=('session_key', 'product'), name='cart_session_product_unique'),
+        ),
+    ]
@@ -1,17 +1,189 @@
-from django.db import models
+from decimal import Decimal
+
+from django.db import connection, models, transaction
+from django.db.models import DecimalField, F, Sum, Value
+from django.db.models.functions import Coalesce
 
 from goods.models import Products
 from users.models import User
 
 
+# Наибольшее количество товара в строке корзины — предел поля quantity
+# (smallint)
+CART_MAX_QUANTITY = 32767
+# Наибольший id товара или строки корзины (bigint)
+MAX_ID = 2 ** 63 - 1
+
+
+def cart_totals(lines):
+    """
+    Считает количество товаров и сумму по строкам корзины с загруженными
+    товарами без запросов к БД.
+
+    Args:
+        lines (iterable): Строки корзины (Cart).
+
+    Returns:
+        dict: 'total_quantity' и 'total_price'.
+    """
+    return {
+        'total_quantity': sum(cart.quantity for cart in lines),
+        'total_price': sum(
+            (cart.products_price() for cart in lines), Decimal('0.00')),
+    }
+
+
 class CartQueryset(models.QuerySet):
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self._totals = None  # Итоги корзины, см. totals()
+
+    def add_product(self, product_id, user=None, session_key=None,
+                    quantity=1):
+        """
+        Добавляет товар в корзину пользователя или сессии одним запросом.
+
+        Выполняет INSERT ... ON CONFLICT DO UPDATE по частичным уникальным
+        индексам корзины: если строка с этим товаром уже есть, количество
+        увеличивается на стороне БД, поэтому одновременные запросы не
+        теряют добавления и не создают дубликатов.
+
+        Args:
+            product_id (int): id товара.
+            user (User, optional): Владелец корзины.
+            session_key (str, optional): Ключ сессии анонимной корзины.
+            quantity (int): На сколько увеличить количество.
+
+        Returns:
+            tuple | None: (id строки корзины, новое количество) или None,
+                          если товара не существует.
+        """
+        rows = self.upsert_lines(
+            {product_id: quantity}, user=user, session_key=session_key)
+        if not rows:
+            return None
+        line_id, _, new_quantity = rows[0]
+        return line_id, new_quantity
+
+    def upsert_lines(self, quantities, user=None, session_key=None,
+                     increment=True):
+        """
+        Записывает несколько строк корзины одним запросом.
+
+        Строит INSERT ... SELECT из списка VALUES и разрешает конфликты по
+        частичным уникальным индексам корзины. Несуществующие товары
+        пропускаются, увеличенное количество не превышает
+        CART_MAX_QUANTITY.
+
+        Args:
+            quantities (dict): Количество по id товара.
+            user (User, optional): Владелец корзины.
+            session_key (str, optional): Ключ сессии анонимной корзины.
+            increment (bool): Прибавить количество к уже лежащему в
+                              корзине (True) или заменить его (False).
+
+        Returns:
+            list: Кортежи (id строки, id товара, новое количество).
+        """
+        if not quantities:
+            return []
+        if user is not None:
+            owner_column, owner = 'user_id', user.pk
+        else:
+            owner_column, owner = 'session_key', session_key
+        table = Cart._meta.db_table
+        values = ', '.join(['(%s::bigint, %s::integer)'] * len(quantities))
+        # Сумма ограничивается пределом поля, иначе переполнение smallint
+        new_quantity = (
+            f'LEAST({table}.quantity::integer + EXCLUDED.quantity, '
+            f'{CART_MAX_QUANTITY})' if increment else 'EXCLUDED.quantity')
+        sql = f'''
+            INSERT INTO {table}
+                ({owner_column}, product_id, quantity, created_timestamp)
+            SELECT %s, line.product_id, line.quantity, NOW()
+            FROM (VALUES {values}) AS line (product_id, quantity)
+            WHERE line.product_id IN (
+                SELECT id FROM {Products._meta.db_table})
+            ON CONFLICT ({owner_column}, product_id)
+                WHERE {owner_column} IS NOT NULL
+            DO UPDATE SET quantity = {new_quantity}
+            RETURNING id, product_id, quantity
+        '''
+        params = [owner]
+        for product_id, quantity in quantities.items():
+            params.extend([product_id, quantity])
+        with connection.cursor() as cursor:
+            cursor.execute(sql, params)
+            return cursor.fetchall()
+
+    def merge_carts(self, session_key, user):
+        """
+        Переносит анонимную корзину сессии в корзину пользователя.
+
+        Строки сессии группируются по товару и вставляются пользователю
+        одним INSERT ... SELECT ... ON CONFLICT: если товар уже есть в
+        корзине пользователя, количества складываются. Затем строки сессии
+        удаляются. Оба запроса выполняются в одной транзакции, их число не
+        зависит от размера корзины.
+
+        Args:
+            session_key (str): Ключ сессии до входа в аккаунт.
+            user (User): Пользователь, вошедший в аккаунт.
+        """
+        table = Cart._meta.db_table
+        sql = f'''
+            INSERT INTO {table}
+                (user_id, product_id, quantity, created_timestamp)
+            SELECT %s, product_id, SUM(quantity), MIN(created_timestamp)
+            FROM {table}
+            WHERE session_key = %s AND user_id IS NULL
+            GROUP BY product_id
+            ON CONFLICT (user_id, product_id) WHERE user_id IS NOT NULL
+            DO UPDATE SET quantity = LEAST(
+                {table}.quantity::integer + EXCLUDED.quantity,
+                {CART_MAX_QUANTITY})
+        '''
+        with transaction.atomic():
+            with connection.cursor() as cursor:
+                cursor.execute(sql, [user.pk, session_key])
+            Cart.objects.filter(
+                session_key=session_key, user__isnull=True).delete()
+
+    def totals(self):
+        """
+        Возвращает количество товаров и сумму корзины.
+
+        Если строки корзины уже загружены вместе с товарами, итоги
+        считаются по ним без запросов. Иначе выполняется один запрос
+        aggregate() по полю product.final_price — цене со скидкой, которую
+        БД считает по формуле Products.discounted_price(). Результат
+        запоминается в наборе, поэтому повторные вызовы из шаблонов
+        бесплатны.
+
+        Returns:
+            dict: 'total_quantity' и 'total_price'.
+        """
+        if self._totals is None:
+            lines = self._result_cache
+            if lines is not None and all(
+                    Cart.product.is_cached(cart) for cart in lines):
+                self._totals = cart_totals(lines)
+            else:
+                self._totals = self.aggregate(
+                    total_quantity=Coalesce(Sum('quantity'), 0),
+                    total_price=Coalesce(
+                        Sum(F('product__final_price') * F('quantity'),
+                            output_field=DecimalField()),
+                        Value(Decimal('0.00')),
+                        output_field=DecimalField()),
+                )
+        return self._totals
+
     def total_price(self):
-        return sum(cart.products_price() for cart in self)
+        return self.totals()['total_price']
 
     def total_quantity(self):
-        if self:
-            return sum(cart.quantity for cart in self)
-        return 0
+        return self.totals()['total_quantity']
 
 
 class Cart(models.Model):
@@ -30,6 +202,26 @@ class Cart(models.Model):
         db_table = 'cart'
         verbose_name = 'Корзина'
         verbose_name_plural = 'Корзины'
+        constraints = [
+            # Одна строка на товар в корзине пользователя и в корзине сессии
+            models.UniqueConstraint(
+                fields=['user', 'product'],
+                condition=models.Q(user__isnull=False),
+                name='cart_user_product_unique'),
+            models.UniqueConstraint(
+                fields=['session_key', 'product'],
+                condition=models.Q(session_key__isnull=False),
+                name='cart_session_product_unique'),
+        ]
+        indexes = [
+            # Частичные индексы анонимных корзин для их очистки
+            models.Index(fields=['session_key'],
+                         condition=models.Q(user__isnull=True),
+                         name='cart_anon_session_idx'),
+            models.Index(fields=['created_timestamp'],
+                         condition=models.Q(user__isnull=True),
+                         name='cart_anon_created_idx'),
+        ]
 
     objects = CartQueryset().as_manager()
 
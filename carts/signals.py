@@ -0,0 +1,29 @@
+from django.core.cache import cache
+from django.db import transaction
+from django.db.models.signals import pre_delete
+from django.dispatch import receiver
+
+from carts.models import Cart
+from carts.utils import summary_cache_key
+from goods.models import Products
+
+
+@receiver(pre_delete, sender=Products)
+def forget_product_cart_summaries(sender, instance, **kwargs):
+    """
+    Сбрасывает сводки корзин пользователей, в которых лежит удаляемый
+    товар.
+
+    Строки корзины удаляются каскадом в обход представлений корзины,
+    поэтому без этого значок в шапке показывал бы удаленный товар до
+    истечения CART_SUMMARY_TIMEOUT. Сводки удаляются после фиксации
+    транзакции.
+    """
+    keys = [
+        summary_cache_key(user_id)
+        for user_id in Cart.objects.filter(
+            product=instance, user__isnull=False
+        ).values_list('user_id', flat=True)
+    ]
+    if keys:
+        transaction.on_commit(lambda: cache.delete_many(keys))
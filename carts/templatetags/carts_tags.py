@@ -1,6 +1,6 @@
 from django import template
 
-from carts.utils import get_user_carts
+from carts.utils import get_cart_summary, get_request_cart
 
 
 register = template.Library()
@@ -8,4 +8,9 @@ register = template.Library()
 
 @register.simple_tag()
 def user_carts(request):
-    return get_user_carts(request)
+    return get_request_cart(request)
+
+
+@register.simple_tag()
+def cart_summary(request):
+    return get_cart_summary(request)
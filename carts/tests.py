@@ -1,3 +1,156 @@
-from django.test import TestCase
+from decimal import Decimal
+from unittest import skipUnless
 
-# Create your tests here.
+from django.db import connection
+from django.test import RequestFactory, SimpleTestCase, TestCase
+
+from carts.backends import SESSION_CART_KEY, SessionCart
+from carts.models import CART_MAX_QUANTITY, Cart
+from carts.utils import compose_cart_operations
+from carts.views import CartChangeView, CartRemoveView
+from goods.testing import create_product
+from users.models import User
+
+
+class CartInputBoundsTest(SimpleTestCase):
+    """
+    Количество и id из запроса проверяются до обращения к БД: значения
+    вне пределов smallint и bigint дают 400, а не ошибку БД.
+    """
+
+    def test_operations_out_of_bounds(self):
+        for operation in (
+            {'op': 'add', 'product_id': 1, 'quantity': 0},
+            {'op': 'add', 'product_id': 1, 'quantity': CART_MAX_QUANTITY + 1},
+            {'op': 'set', 'product_id': 1, 'quantity': 10 ** 6},
+            {'op': 'add', 'product_id': 0},
+            {'op': 'remove', 'product_id': 2 ** 63},
+            {'op': 'remove', 'product_id': 'abc'},
+        ):
+            with self.subTest(operation=operation), \
+                    self.assertRaises(ValueError):
+                compose_cart_operations([operation])
+
+    def test_added_quantity_is_capped(self):
+        increments, _, _ = compose_cart_operations([
+            {'op': 'add', 'product_id': 1, 'quantity': CART_MAX_QUANTITY},
+            {'op': 'add', 'product_id': 1, 'quantity': 5},
+        ])
+        self.assertEqual(increments, {1: CART_MAX_QUANTITY})
+
+    def test_session_cart_is_capped(self):
+        session = {SESSION_CART_KEY: {'1': CART_MAX_QUANTITY - 1}}
+        cart = SessionCart(session)
+        cart.set(1, 10 ** 6)
+        self.assertEqual(session[SESSION_CART_KEY]['1'], CART_MAX_QUANTITY)
+
+    def test_views_reject_bad_input(self):
+        factory = RequestFactory()
+        for view, data in (
+            (CartChangeView, {'cart_id': 1, 'quantity': 40000}),
+            (CartChangeView, {'cart_id': -1, 'quantity': 1}),
+            (CartRemoveView, {'cart_id': 'abc'}),
+            (CartRemoveView, {'cart_id': 2 ** 63}),
+        ):
+            with self.subTest(view=view.__name__, data=data):
+                response = view.as_view()(factory.post('/', data))
+                self.assertEqual(response.status_code, 400)
+
+
+class CartTotalsTest(TestCase):
+    """
+    Итоги корзины: один запрос aggregate() по final_price или подсчет по
+    уже загруженным строкам дают одинаковый результат и запоминаются.
+    """
+
+    @classmethod
+    def setUpTestData(cls):
+        user = User.objects.create_user(username='buyer', password='password')
+        # Половина копейки: цена со скидкой 5.03
+        bears = create_product(price=Decimal('10.05'), discount=50)
+        worms = create_product(name='Червячки', slug='worms', price=3)
+        Cart.objects.create(user=user, product=bears, quantity=2)
+        Cart.objects.create(user=user, product=worms, quantity=1)
+        cls.user = user
+
+    def test_aggregate_matches_line_sum(self):
+        lines = Cart.objects.filter(user=self.user)
+        with self.assertNumQueries(1):
+            totals = lines.totals()
+            self.assertEqual(lines.total_price(), Decimal('13.06'))
+            self.assertEqual(lines.total_quantity(), 3)
+
+        loaded = Cart.objects.filter(user=self.user).select_related('product')
+        line_sum = {
+            'total_quantity': sum(cart.quantity for cart in loaded),
+            'total_price': sum(cart.products_price() for cart in loaded),
+        }
+        with self.assertNumQueries(0):
+            self.assertEqual(loaded.totals(), line_sum)
+        self.assertEqual(totals, line_sum)
+
+
+@skipUnless(connection.vendor == 'postgresql',
+            'INSERT ... ON CONFLICT по частичным индексам PostgreSQL')
+class CartUpsertTest(TestCase):
+    """
+    Запись строк корзины через INSERT ... ON CONFLICT по частичным
+    уникальным индексам корзины пользователя и сессии.
+    """
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.bears = create_product()
+        cls.worms = create_product(name='Червячки', slug='worms', price=50)
+        cls.user = User.objects.create_user(
+            username='buyer', password='password')
+
+    def quantities(self, **owner):
+        return dict(Cart.objects.filter(**owner)
+                    .values_list('product_id', 'quantity'))
+
+    def test_quantity_is_summed_on_conflict(self):
+        first = Cart.objects.add_product(self.bears.id, user=self.user)
+        second = Cart.objects.add_product(
+            self.bears.id, user=self.user, quantity=2)
+        self.assertEqual(first[0], second[0])
+        self.assertEqual(second[1], 3)
+        self.assertEqual(self.quantities(user=self.user), {self.bears.id: 3})
+
+    def test_user_and_session_targets(self):
+        Cart.objects.upsert_lines(
+            {self.bears.id: 2, self.worms.id: 1}, user=self.user)
+        Cart.objects.upsert_lines({self.bears.id: 5}, session_key='session')
+        Cart.objects.upsert_lines(
+            {self.bears.id: 1}, user=self.user, increment=False)
+
+        self.assertEqual(self.quantities(user=self.user),
+                         {self.bears.id: 1, self.worms.id: 1})
+        self.assertEqual(self.quantities(session_key='session'),
+                         {self.bears.id: 5})
+
+    def test_missing_product_is_skipped(self):
+        rows = Cart.objects.upsert_lines(
+            {self.bears.id: 1, self.worms.id + 1000: 1}, user=self.user)
+        self.assertEqual([row[1] for row in rows], [self.bears.id])
+
+    def test_sum_is_capped(self):
+        Cart.objects.upsert_lines(
+            {self.bears.id: CART_MAX_QUANTITY}, user=self.user)
+        Cart.objects.upsert_lines({self.bears.id: 10}, user=self.user)
+        self.assertEqual(self.quantities(user=self.user),
+                         {self.bears.id: CART_MAX_QUANTITY})
+
+    def test_merge_into_existing_user_cart(self):
+        Cart.objects.upsert_lines({self.bears.id: 2}, user=self.user)
+        Cart.objects.upsert_lines(
+            {self.bears.id: 3, self.worms.id: 1}, session_key='session')
+        Cart.objects.upsert_lines({self.worms.id: 4}, session_key='other')
+
+        Cart.objects.merge_carts('session', self.user)
+
+        self.assertEqual(self.quantities(user=self.user),
+                         {self.bears.id: 5, self.worms.id: 1})
+        self.assertEqual(self.quantities(session_key='session'), {})
+        self.assertEqual(self.quantities(session_key='other'),
+                         {self.worms.id: 4})
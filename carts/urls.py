@@ -10,4 +10,8 @@ urlpatterns = [
     path('cart_change/', views.CartChangeView.as_view(), name='cart_change'),
     # Удаление товара из корзины
     path('cart_remove/', views.CartRemoveView.as_view(), name='cart_remove'),
+    # Пакетное изменение корзины
+    path('cart_batch/', views.CartBatchView.as_view(), name='cart_batch'),
+    # Содержимое корзины для модального окна
+    path('cart_items/', views.CartItemsView.as_view(), name='cart_items'),
 ]
@@ -1,10 +1,411 @@
-from carts.models import Cart
+from datetime import timedelta
 
+from django.conf import settings
+from django.contrib.sessions.models import Session
+from django.core.cache import cache
+from django.db.models import Exists, OuterRef
+from django.http import JsonResponse
+from django.template.loader import render_to_string
+from django.utils import timezone
 
-def get_user_carts(request):
+from carts.backends import SessionCart, get_cart_backend
+from carts.models import (
+    CART_MAX_QUANTITY, MAX_ID, Cart, CartQueryset, cart_totals
+)
+from goods.utils import available_stock
+from marmalade_shop.batches import head_batches, keyset_batches, run_batches
+
+
+class RequestCart:
+    """
+    Корзина текущего запроса.
+
+    Загружает строки корзины вместе с товарами один раз за запрос из
+    хранилища, выбранного get_cart_backend() (БД или сессия), и
+    запоминает итоги, поэтому значок корзины, модальное окно и
+    представления корзины используют один и тот же результат. Повторяет
+    интерфейс CartQueryset, нужный шаблонам: перебор строк, проверку на
+    пустоту, total_quantity() и total_price(). После изменения корзины
+    нужно вызвать invalidate().
+
+    Args:
+        request (HttpRequest): объект запроса от пользователя.
+    """
+
+    def __init__(self, request):
+        self.request = request
+        self._lines = None
+        self._totals = None
+
+    def __iter__(self):
+        return iter(self.lines)
+
+    def __len__(self):
+        return len(self.lines)
+
+    def __bool__(self):
+        return bool(self.lines)
+
+    @property
+    def lines(self):
+        if self._lines is None:
+            self._lines = get_cart_backend(self.request).lines()
+        return self._lines
+
+    def get_line(self, line_id):
+        return next((cart for cart in self.lines if cart.id == line_id), None)
+
+    def totals(self):
+        if self._totals is None:
+            lines = self.lines
+            # Строки из БД считают итоги сами: по загруженным строкам или
+            # одним aggregate(); строки из сессии уже загружены
+            self._totals = (lines.totals() if isinstance(lines, CartQueryset)
+                            else cart_totals(lines))
+        return self._totals
+
+    def total_quantity(self):
+        return self.totals()['total_quantity']
+
+    def total_price(self):
+        return self.totals()['total_price']
+
+    def invalidate(self):
+        """
+        Сбрасывает загруженные строки и итоги после изменения корзины.
+        """
+        self._lines = None
+        self._totals = None
+
+
+def get_request_cart(request):
+    """
+    Возвращает корзину текущего запроса, созданную CartMiddleware, или
+    новую, если middleware не подключен.
+    """
+    if not hasattr(request, 'cart'):
+        request.cart = RequestCart(request)
+    return request.cart
+
+
+# Ключ сессии со сводкой анонимной корзины
+CART_SUMMARY_SESSION_KEY = 'cart_summary'
+
+
+def summary_cache_key(user_id):
+    return f'cart:summary:{user_id}'
+
+
+def get_cart_summary(request):
+    """
+    Возвращает сводку корзины для значка в шапке сайта.
+
+    Сводка хранится в кэше для пользователя (общая для всех его
+    устройств) и в сессии для анонимного посетителя, поэтому шапка
+    отрисовывается без обращения к таблице cart. Если сводки еще нет,
+    она считается по корзине запроса и сохраняется.
+
+    Args:
+        request (HttpRequest): объект запроса от пользователя.
+
+    Returns:
+        dict: 'total_quantity' (int) и 'total_price' (str).
+    """
+    if request.user.is_authenticated:
+        summary = cache.get(summary_cache_key(request.user.pk))
+    else:
+        summary = request.session.get(CART_SUMMARY_SESSION_KEY)
+    if summary is None:
+        summary = store_cart_summary(request)
+    return summary
+
+
+def store_cart_summary(request, carts=None):
+    """
+    Пересчитывает и сохраняет сводку корзины.
+
+    Пустая корзина анонимного посетителя не сохраняется, чтобы не
+    создавать сессию для каждого посетителя.
+
+    Args:
+        request (HttpRequest): объект запроса от пользователя.
+        carts (RequestCart, optional): Уже загруженная корзина запроса.
+
+    Returns:
+        dict: Сводка корзины, см. get_cart_summary.
+    """
+    if carts is None:
+        carts = get_request_cart(request)
+    summary = {
+        'total_quantity': carts.total_quantity(),
+        'total_price': str(carts.total_price()),
+    }
+    if request.user.is_authenticated:
+        cache.set(summary_cache_key(request.user.pk), summary,
+                  getattr(settings, 'CART_SUMMARY_TIMEOUT', 60 * 15))
+    elif summary['total_quantity']:
+        request.session[CART_SUMMARY_SESSION_KEY] = summary
+    else:
+        request.session.pop(CART_SUMMARY_SESSION_KEY, None)
+    return summary
+
+
+def forget_cart_summary(request):
+    """
+    Удаляет сводку корзины, например после входа в аккаунт или
+    оформления заказа; при следующем запросе она будет пересчитана.
+
+    Внутри транзакции вызывается через transaction.on_commit(): иначе
+    параллельный запрос успел бы пересчитать сводку по еще не удаленным
+    строкам и сохранить ее.
+    """
+    request.session.pop(CART_SUMMARY_SESSION_KEY, None)
     if request.user.is_authenticated:
-        return Cart.objects.filter(user=request.user)
+        cache.delete(summary_cache_key(request.user.pk))
+
+
+# Операции пакетного изменения корзины
+CART_OPERATIONS = ('add', 'set', 'remove')
+
+
+def clean_id(value):
+    """
+    Приводит id товара или строки корзины из запроса к числу.
+
+    Raises:
+        TypeError, ValueError: Если значение не является id в пределах
+                               bigint.
+    """
+    value = int(value)
+    if not 1 <= value <= MAX_ID:
+        raise ValueError(value)
+    return value
+
+
+def clean_quantity(value):
+    """
+    Приводит количество товара из запроса к числу.
+
+    Raises:
+        TypeError, ValueError: Если количество меньше 1 или больше
+                               CART_MAX_QUANTITY.
+    """
+    value = int(value)
+    if not 1 <= value <= CART_MAX_QUANTITY:
+        raise ValueError(value)
+    return value
+
+
+def compose_cart_operations(operations):
+    """
+    Сводит список операций над корзиной к трем наборам изменений.
+
+    Операции применяются по порядку и сворачиваются по товару: например,
+    add 2 после set 3 дает set 5, а remove после add — удаление. Поэтому
+    результат можно записать в хранилище корзины постоянным числом
+    запросов. Сумма нескольких add ограничивается CART_MAX_QUANTITY.
+
+    Args:
+        operations (list): Словари {'op': 'add' | 'set' | 'remove',
+                           'product_id': int, 'quantity': int}; для
+                           remove количество не нужно.
+
+    Returns:
+        tuple: (увеличения, новые количества, удаления) — два словаря по
+               id товара и множество id товаров.
+
+    Raises:
+        ValueError: Если операция некорректна, id товара или количество
+                    вне допустимых пределов.
+    """
+    state = {}  # id товара -> ('add' | 'set', количество)
+    for operation in operations:
+        if not isinstance(operation, dict) or \
+                operation.get('op') not in CART_OPERATIONS:
+            raise ValueError(operation)
+        op = operation['op']
+        product_id = clean_id(operation.get('product_id'))
+        if op == 'remove':
+            state[product_id] = ('set', 0)
+            continue
+        quantity = clean_quantity(operation.get('quantity', 1))
+        current = state.get(product_id)
+        if op == 'add' and current is not None:
+            state[product_id] = (
+                current[0], min(current[1] + quantity, CART_MAX_QUANTITY))
+        else:
+            state[product_id] = (op, quantity)
+
+    increments, quantities, removals = {}, {}, set()
+    for product_id, (op, quantity) in state.items():
+        if op == 'add':
+            increments[product_id] = quantity
+        elif quantity:
+            quantities[product_id] = quantity
+        else:
+            removals.add(product_id)
+    return increments, quantities, removals
+
+
+def short_of_stock(quantities):
+    """
+    Возвращает товары, которых не хватает на складе с учетом резервов.
+
+    Остаток всех товаров читается одним запросом. Несуществующие товары
+    не возвращаются: хранилища корзины их пропускают.
+
+    Args:
+        quantities (dict): Запрошенное количество по id товара.
+
+    Returns:
+        dict: Доступный остаток по id товаров, которых не хватает.
+    """
+    return {
+        product_id: max(available, 0)
+        for product_id, available in available_stock(quantities).items()
+        if available < quantities[product_id]
+    }
+
+
+def move_anonymous_cart(request, user, session_key):
+    """
+    Переносит анонимную корзину пользователю после входа или регистрации.
+
+    Количество товаров, которые уже лежат в корзине пользователя,
+    увеличивается; число запросов не зависит от размера корзины.
+
+    Args:
+        request (HttpRequest): объект запроса от пользователя.
+        user (User): Пользователь, вошедший в аккаунт.
+        session_key (str): Ключ сессии до входа; auth.login() меняет
+                           ключ, поэтому его нужно сохранить заранее.
+    """
+    # Корзина из сессии: данные сессии переживают смену ключа
+    SessionCart(request.session).materialize(user)
+    if session_key:
+        # Корзина из БД (CART_ANONYMOUS_BACKEND = 'db'); одинаковые товары
+        # объединяются, а не дублируются
+        Cart.objects.merge_carts(session_key, user)
+    forget_cart_summary(request)
+
+
+def cart_line_data(cart):
+    """
+    Сериализует строку корзины для ответа в режиме изменений (delta).
+
+    Args:
+        cart (Cart): Строка корзины с загруженным товаром.
+
+    Returns:
+        dict: Данные строки.
+    """
+    return {
+        'id': cart.id,
+        'product_id': cart.product_id,
+        'quantity': cart.quantity,
+        'price': str(cart.product.discounted_price()),
+        'products_price': str(cart.products_price()),
+    }
+
+
+def cart_response(request, message, line_id=None, **extra):
+    """
+    Формирует ответ представлений изменения корзины.
+
+    По умолчанию возвращает заново отрисованную разметку корзины. Если в
+    запросе передан параметр 'delta', вместо разметки возвращаются только
+    измененная строка (или None, если ее больше нет). В обоих режимах
+    ответ содержит новые итоги, которые также сохраняются в сводку
+    корзины, а корзина загружается одним запросом.
+
+    Args:
+        request (HttpRequest): объект запроса от пользователя.
+        message (str): Сообщение для пользователя.
+        line_id (int, optional): id измененной строки корзины.
+        **extra: Дополнительные поля ответа.
+
+    Returns:
+        JsonResponse: Ответ для фронтенда.
+    """
+    carts = get_request_cart(request)
+    carts.invalidate()  # Корзина только что изменилась
+    # Итоги для значка корзины считаются по тем же загруженным строкам
+    data = {"message": message, **extra, **store_cart_summary(request)}
+    if request.POST.get('delta'):
+        line = carts.get_line(line_id)
+        data["line"] = cart_line_data(line) if line else None
+    else:
+        data["cart_items_html"] = render_to_string(
+            "carts/includes/included_cart.html",
+            {"carts": carts},
+            request=request
+        )
+    return JsonResponse(data)
+
+
+# Движки сессий, хранящие сессии в таблице django_session
+DB_SESSION_ENGINES = (
+    'django.contrib.sessions.backends.db',
+    'django.contrib.sessions.backends.cached_db',
+)
+
+
+def delete_stale_carts(max_age=None, batch_size=1000, pause=0,
+                       progress=None):
+    """
+    Удаляет брошенные анонимные корзины пакетами.
+
+    Брошенной считается строка без пользователя, которая старше max_age
+    или сессия которой истекла либо удалена. Удаление выполняется в два
+    прохода, каждый по своему частичному индексу анонимных корзин:
+
+    - старые строки отбираются по возрастанию created_timestamp
+      (cart_anon_created_idx); удаленные строки выпадают из выборки,
+      поэтому каждый пакет читает начало диапазона индекса;
+    - строки с истекшей или удаленной сессией отбираются по возрастанию
+      session_key (cart_anon_session_idx) от последнего проверенного
+      ключа; пакетом служат batch_size сессий. Этот проход выполняется
+      только для движков сессий, хранящих их в БД.
+
+    Каждая транзакция короткая и не блокирует таблицу cart; между
+    пакетами можно сделать паузу, чтобы снизить нагрузку на работающий
+    магазин. При удалении условие проверяется повторно, и строки,
+    перенесенные пользователю между выборкой и удалением, не удаляются.
+
+    Args:
+        max_age (timedelta, optional): Максимальный возраст анонимной
+                                       строки; по умолчанию равен
+                                       SESSION_COOKIE_AGE.
+        batch_size (int): Количество строк (сессий во втором проходе) в
+                          одном пакете.
+        pause (float): Пауза между пакетами, в секундах.
+        progress (callable, optional): Вызывается после каждого пакета с
+                                       количеством удаленных строк.
+
+    Returns:
+        int: Количество удаленных строк.
+    """
+    if max_age is None:
+        max_age = timedelta(seconds=settings.SESSION_COOKIE_AGE)
+    now = timezone.now()
+    anonymous = Cart.objects.filter(
+        user__isnull=True, session_key__isnull=False)
+
+    # Первый проход: строки старше max_age
+    old = anonymous.filter(created_timestamp__lt=now - max_age)
+    deleted = run_batches(
+        head_batches(old, 'created_timestamp', batch_size),
+        lambda ids: old.filter(id__in=ids).delete()[0],
+        pause=pause, progress=progress)
+
+    if settings.SESSION_ENGINE not in DB_SESSION_ENGINES:
+        return deleted
 
-    if not request.session.session_key:
-        request.session.create()
-    return Cart.objects.filter(session_key=request.session.session_key)
+    # Второй проход: строки с истекшей или удаленной сессией
+    live_session = Session.objects.filter(
+        session_key=OuterRef('session_key'), expire_date__gt=now)
+    orphaned = anonymous.filter(~Exists(live_session))
+    return run_batches(
+        keyset_batches(orphaned, 'session_key', batch_size),
+        lambda keys: orphaned.filter(session_key__in=keys).delete()[0],
+        pause=pause, progress=progress, total=deleted)
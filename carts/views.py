@@ -1,9 +1,14 @@
+import json
+
 from django.http import JsonResponse
-from django.template.loader import render_to_string
+from django.shortcuts import render
 from django.views import View
-from carts.models import Cart
-from goods.models import Products
-from carts.utils import get_user_carts
+from carts.backends import get_cart_backend
+from carts.utils import (
+    cart_response, clean_id, clean_quantity, compose_cart_operations,
+    get_request_cart, short_of_stock
+)
+from goods.utils import available_stock
 
 
 class CartAddView(View):
@@ -12,39 +17,35 @@ class CartAddView(View):
 
     Обрабатывает POST-запросы для добавления товаров в корзину пользователя,
     автоматически увеличивает количество если товар уже есть в корзине.
+    Добавление выполняется атомарно на стороне БД, поэтому повторные
+    быстрые клики не теряют увеличения количества. Анонимная корзина
+    по умолчанию хранится в сессии и не создает строк в БД. Товар без
+    доступного остатка (с учетом резервов) в корзину не добавляется.
 
     Args:
         request (HttpRequest): объект запроса от пользователя.
     """
     def post(self, request):
-        product_id = request.POST.get('product_id')
-        product = Products.objects.get(id=product_id)
-        if request.user.is_authenticated:
-            # Создание элемента корзины для аутентифицированного пользователя
-            cart, created = Cart.objects.get_or_create(
-                user=request.user, product=product)
-            if not created:
-                cart.quantity += 1
-                cart.save()
-        else:
-            # Создание элемента корзины для неаутентифицированного пользователя
-            cart, created = Cart.objects.get_or_create(
-                session_key=request.session.session_key, product=product)
-            if not created:
-                cart.quantity += 1
-                cart.save()
-
-        user_cart = get_user_carts(request)
-        cart_items_html = render_to_string(
-            "carts/includes/included_cart.html",
-            {"carts": user_cart},
-            request=request
-        )
-
-        return JsonResponse({
-            "message": "Товар добавлен в корзину",
-            "cart_items_html": cart_items_html,
-        })
+        try:
+            product_id = clean_id(request.POST.get('product_id'))
+        except (TypeError, ValueError):
+            return JsonResponse(
+                {"message": "Некорректный товар"}, status=400)
+
+        available = available_stock([product_id]).get(product_id)
+        if available is None:
+            return JsonResponse({"message": "Товар не найден"}, status=404)
+        if available < 1:
+            return JsonResponse(
+                {"message": "Товара нет в наличии"}, status=400)
+
+        # В БД добавление выполняется одним запросом INSERT ... ON CONFLICT
+        line_id = get_cart_backend(request).add(product_id)
+        if line_id is None:
+            return JsonResponse({"message": "Товар не найден"}, status=404)
+
+        return cart_response(
+            request, "Товар добавлен в корзину", line_id=line_id)
 
 
 class CartChangeView(View):
@@ -52,30 +53,37 @@ class CartChangeView(View):
     Представление для изменения количества товара в корзине.
 
     Обрабатывает POST-запросы для изменения количества товара в корзине,
-    сохраняя изменения в базе данных.
+    сохраняя изменения в хранилище корзины. Изменяются только строки корзины
+    текущего пользователя или сессии. Количество больше доступного остатка
+    (с учетом резервов) не принимается.
 
     Args:
         request (HttpRequest): объект запроса от пользователя.
     """
     def post(self, request):
-        cart_id = request.POST.get("cart_id")
-        quantity = request.POST.get("quantity")
-        cart = Cart.objects.get(id=cart_id)
-        cart.quantity = quantity
-        cart.save()
-
-        user_cart = get_user_carts(request)
-        cart_items_html = render_to_string(
-            "carts/includes/included_cart.html",
-            {"carts": user_cart},
-            request=request
-        )
-
-        return JsonResponse({
-            "message": "Количество изменено",
-            "cart_items_html": cart_items_html,
-            "quantity": cart.quantity,
-        })
+        try:
+            cart_id = clean_id(request.POST.get("cart_id"))
+            quantity = clean_quantity(request.POST.get("quantity"))
+        except (TypeError, ValueError):
+            return JsonResponse(
+                {"message": "Некорректные данные"}, status=400)
+
+        backend = get_cart_backend(request)
+        product_id = backend.line_product_id(cart_id)
+        if product_id is None:
+            return JsonResponse({"message": "Товар не найден"}, status=404)
+        short = short_of_stock({product_id: quantity})
+        if short:
+            return JsonResponse(
+                {"message": f"Доступно только {short[product_id]} шт."},
+                status=400)
+
+        if not backend.set(cart_id, quantity):
+            return JsonResponse({"message": "Товар не найден"}, status=404)
+
+        return cart_response(
+            request, "Количество изменено", line_id=cart_id,
+            quantity=quantity)
 
 
 class CartRemoveView(View):
@@ -89,20 +97,76 @@ class CartRemoveView(View):
         request (HttpRequest): объект запроса от пользователя.
     """
     def post(self, request):
-        cart_id = request.POST.get("cart_id")
-        cart = Cart.objects.get(id=cart_id)
-        quantity = cart.quantity
-        cart.delete()
-
-        user_cart = get_user_carts(request)
-        cart_items_html = render_to_string(
-            "carts/includes/included_cart.html",
-            {"carts": user_cart},
-            request=request
-        )
-
-        return JsonResponse({
-            "message": "Товар удален",
-            "cart_items_html": cart_items_html,
-            "quantity_deleted": quantity,
+        try:
+            cart_id = clean_id(request.POST.get("cart_id"))
+        except (TypeError, ValueError):
+            return JsonResponse(
+                {"message": "Некорректные данные"}, status=400)
+        quantity = get_cart_backend(request).remove(cart_id)
+        if quantity is None:
+            return JsonResponse({"message": "Товар не найден"}, status=404)
+
+        return cart_response(
+            request, "Товар удален", line_id=cart_id,
+            quantity_deleted=quantity)
+
+
+class CartBatchView(View):
+    """
+    Представление для пакетного изменения корзины.
+
+    Принимает в POST-параметре 'operations' JSON-список операций add, set
+    и remove над товарами (см. compose_cart_operations), применяет их в
+    одной транзакции постоянным числом запросов и один раз отрисовывает
+    корзину. Используется при синхронизации корзины с черновиком на
+    фронтенде, например при повторе заказа. Если какого-либо товара
+    запрошено больше доступного остатка, пакет не применяется.
+
+    Args:
+        request (HttpRequest): объект запроса от пользователя.
+    """
+    # Максимальное количество операций в одном запросе
+    max_operations = 100
+
+    def post(self, request):
+        try:
+            operations = json.loads(request.POST.get("operations", ""))
+            if not isinstance(operations, list) or \
+                    len(operations) > self.max_operations:
+                raise ValueError(operations)
+            increments, quantities, removals = compose_cart_operations(
+                operations)
+        except (TypeError, ValueError):
+            return JsonResponse(
+                {"message": "Некорректные данные"}, status=400)
+
+        short = short_of_stock({**increments, **quantities})
+        if short:
+            return JsonResponse({
+                "message": "Товара недостаточно на складе",
+                "available": {
+                    str(product_id): available
+                    for product_id, available in short.items()
+                },
+            }, status=400)
+
+        get_cart_backend(request).apply(increments, quantities, removals)
+
+        return cart_response(
+            request, "Корзина обновлена", operations=len(operations))
+
+
+class CartItemsView(View):
+    """
+    Представление с разметкой содержимого корзины.
+
+    Модальное окно корзины в шапке сайта загружает содержимое отсюда при
+    открытии, поэтому обычные страницы не читают строки корзины.
+
+    Args:
+        request (HttpRequest): объект запроса от пользователя.
+    """
+    def get(self, request):
+        return render(request, "carts/includes/included_cart.html", {
+            "carts": get_request_cart(request),
         })
@@ -0,0 +1,255 @@
+import hashlib
+import threading
+import time
+from collections import OrderedDict, namedtuple
+
+from django.conf import settings
+from django.core.cache import cache
+
+from goods.models import Categories, Products
+
+
+# Область версии, общая для всего каталога (раздел 'all', поиск)
+CATALOG_SCOPE_ALL = 'all'
+# Область версии списка категорий для навигации
+CATALOG_SCOPE_CATEGORIES = 'categories'
+
+# Неизменяемая запись категории для меню и поиска категории по слагу
+CategoryItem = namedtuple('CategoryItem', ['id', 'name', 'slug'])
+
+# Локальная копия списка категорий процесса: (версия, записи)
+_local_categories = (None, ())
+
+# Отметка в кэше об отсутствии товара с таким слагом
+PRODUCT_MISSING = 'missing'
+
+CacheInfo = namedtuple('CacheInfo', ['hits', 'misses', 'maxsize', 'currsize'])
+
+
+def _version_key(scope):
+    return f'catalog:version:{scope}'
+
+
+def catalog_version(scope):
+    """
+    Возвращает текущую версию области каталога.
+
+    Областью является id категории или CATALOG_SCOPE_ALL. Если версии еще
+    нет в кэше, она создается от текущего времени, чтобы не совпасть с
+    версиями записей, оставшихся в кэше после ее вытеснения.
+
+    Args:
+        scope (int | str): Область каталога.
+
+    Returns:
+        int: Номер версии.
+    """
+    key = _version_key(scope)
+    version = cache.get(key)
+    if version is None:
+        cache.add(key, time.time_ns(), timeout=None)
+        version = cache.get(key)
+    return version
+
+
+def bump_catalog_version(*scopes):
+    """
+    Увеличивает версии указанных областей каталога.
+
+    Все закэшированные страницы этих областей становятся недоступны и
+    вытесняются кэшем по таймауту; страницы других категорий не
+    затрагиваются.
+
+    Args:
+        *scopes (int | str): Области каталога; None пропускаются.
+    """
+    for scope in set(scopes):
+        if scope is None:
+            continue
+        key = _version_key(scope)
+        try:
+            cache.incr(key)
+        except ValueError:
+            cache.add(key, time.time_ns(), timeout=None)
+
+
+def catalog_cache_key(scope, *params):
+    """
+    Формирует ключ кэша страницы каталога с учетом версии области.
+
+    Args:
+        scope (int | str): Область каталога.
+        *params: Параметры выборки (фильтры, сортировка, страница, курсор).
+
+    Returns:
+        str: Ключ кэша.
+    """
+    digest = hashlib.md5(repr(params).encode()).hexdigest()
+    return f'catalog:page:{scope}:{catalog_version(scope)}:{digest}'
+
+
+def catalog_cache_timeout():
+    return getattr(settings, 'CATALOG_CACHE_TIMEOUT', 60 * 15)
+
+
+def detach_page(page):
+    """
+    Отвязывает страницу пагинатора от QuerySet перед записью в кэш.
+
+    Page и Paginator хранят исходный QuerySet, при сериализации которого
+    загрузилась бы вся выборка. Количество объектов и страниц к этому
+    моменту уже посчитано и сохранено в cached_property пагинатора, поэтому
+    исходную выборку можно заменить объектами текущей страницы.
+
+    Args:
+        page (Page | KeysetPage): Страница каталога.
+
+    Returns:
+        Page | KeysetPage: Та же страница, пригодная для кэширования.
+    """
+    page.object_list = list(page.object_list)
+    paginator = getattr(page, 'paginator', None)
+    if paginator is not None:
+        paginator.object_list = page.object_list
+    return page
+
+
+def get_categories():
+    """
+    Возвращает список категорий для навигации.
+
+    Использует два уровня кэша: копию в памяти процесса и общую запись в
+    кэше, обе привязаны к версии CATALOG_SCOPE_CATEGORIES. В устойчивом
+    состоянии обходится одним чтением версии из кэша без запросов к БД.
+
+    Returns:
+        tuple: Записи CategoryItem в порядке id.
+    """
+    global _local_categories
+    version = catalog_version(CATALOG_SCOPE_CATEGORIES)
+    local_version, items = _local_categories
+    if local_version == version:
+        return items
+
+    key = f'catalog:categories:{version}'
+    items = cache.get(key)
+    if items is None:
+        items = tuple(
+            CategoryItem(*row) for row in
+            Categories.objects.order_by('id').values_list('id', 'name', 'slug')
+        )
+        cache.set(key, items, catalog_cache_timeout())
+    _local_categories = (version, items)
+    return items
+
+
+def get_category_by_slug(slug):
+    """
+    Находит категорию по слагу в закэшированном списке категорий.
+
+    Args:
+        slug (str): Слаг категории.
+
+    Returns:
+        CategoryItem | None: Категория или None, если ее нет.
+    """
+    for category in get_categories():
+        if category.slug == slug:
+            return category
+    return None
+
+
+def _product_key(slug):
+    return f'catalog:product:{slug}'
+
+
+def get_cached_product(slug):
+    """
+    Возвращает товар по слагу из кэша или из БД.
+
+    Отсутствие товара тоже кэшируется, но на меньший срок, чтобы повторные
+    запросы к несуществующим адресам не доходили до БД.
+
+    Args:
+        slug (str): Слаг товара.
+
+    Returns:
+        Products | None: Товар или None, если его нет.
+    """
+    key = _product_key(slug)
+    product = cache.get(key)
+    if product is None:
+        product = (Products.objects.filter(slug=slug)
+                   .defer('search_vector').first())
+        if product is None:
+            cache.set(key, PRODUCT_MISSING, getattr(
+                settings, 'PRODUCT_NOT_FOUND_CACHE_TIMEOUT', 60))
+            return None
+        cache.set(key, product, catalog_cache_timeout())
+    elif product == PRODUCT_MISSING:
+        return None
+    return product
+
+
+def invalidate_product(*slugs):
+    """
+    Удаляет из кэша товары (и отметки об их отсутствии) по слагам.
+
+    Args:
+        *slugs (str): Слаги товаров; пустые значения пропускаются.
+    """
+    cache.delete_many([_product_key(slug) for slug in set(slugs) if slug])
+
+
+class LRUCache:
+    """
+    Ограниченный по размеру LRU-кэш в памяти процесса с временем жизни
+    записей.
+
+    При переполнении вытесняется запись, к которой дольше всего не
+    обращались. Счетчики попаданий и промахов доступны через cache_info(),
+    по аналогии с functools.lru_cache.
+
+    Args:
+        maxsize (int): Максимальное количество записей.
+        ttl (int): Время жизни записи, в секундах.
+    """
+
+    def __init__(self, maxsize, ttl):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self.hits = 0
+        self.misses = 0
+        self._data = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key):
+        with self._lock:
+            item = self._data.get(key)
+            if item is not None and item[0] < time.monotonic():
+                del self._data[key]
+                item = None
+            if item is None:
+                self.misses += 1
+                return None
+            self._data.move_to_end(key)
+            self.hits += 1
+            return item[1]
+
+    def set(self, key, value):
+        with self._lock:
+            self._data[key] = (time.monotonic() + self.ttl, value)
+            self._data.move_to_end(key)
+            while len(self._data) > self.maxsize:
+                self._data.popitem(last=False)
+
+    def clear(self):
+        with self._lock:
+            self._data.clear()
+            self.hits = 0
+            self.misses = 0
+
+    def cache_info(self):
+        with self._lock:
+            return CacheInfo(
+                self.hits, self.misses, self.maxsize, len(self._data))
@@ -0,0 +1,107 @@
+from collections import namedtuple
+
+from django.core.cache import cache
+from django.db.models import Count, Q
+
+from goods.cache import (
+    catalog_cache_key, catalog_cache_timeout, get_categories
+)
+
+
+# Ценовые диапазоны фильтра каталога по цене со скидкой:
+# (ключ, подпись, от, до)
+PRICE_BANDS = (
+    ('0-200', 'до 200 ₽', None, 200),
+    ('200-500', '200–500 ₽', 200, 500),
+    ('500-1000', '500–1000 ₽', 500, 1000),
+    ('1000-', 'от 1000 ₽', 1000, None),
+)
+
+Facet = namedtuple('Facet', ['key', 'label', 'count'])
+
+
+def price_band_q(key):
+    """
+    Возвращает условие отбора товаров по ключу ценового диапазона.
+
+    Args:
+        key (str): Ключ диапазона из PRICE_BANDS.
+
+    Returns:
+        Q | None: Условие или None для неизвестного ключа.
+    """
+    for band_key, label, low, high in PRICE_BANDS:
+        if band_key != key:
+            continue
+        condition = Q()
+        if low is not None:
+            condition &= Q(final_price__gte=low)
+        if high is not None:
+            condition &= Q(final_price__lt=high)
+        return condition
+    return None
+
+
+def compute_facets(goods):
+    """
+    Считает фасеты каталога одним агрегирующим запросом.
+
+    Запрос группирует товары по категории и в той же строке считает
+    товары со скидкой и товары каждого ценового диапазона через
+    COUNT ... FILTER, итоги по всем категориям складываются в Python.
+
+    Args:
+        goods (QuerySet): Базовый набор товаров без фильтров каталога.
+
+    Returns:
+        dict: 'total', 'on_sale', 'categories' и 'price_bands'; последние
+              два — списки Facet.
+    """
+    aggregates = {
+        'total': Count('id'),
+        'on_sale': Count('id', filter=Q(discount__gt=0)),
+    }
+    for index, band in enumerate(PRICE_BANDS):
+        aggregates[f'band_{index}'] = Count('id', filter=price_band_q(band[0]))
+    rows = goods.order_by().values('category_id').annotate(**aggregates)
+
+    by_category = {}
+    totals = dict.fromkeys(aggregates, 0)
+    for row in rows:
+        by_category[row['category_id']] = row['total']
+        for name in aggregates:
+            totals[name] += row[name]
+
+    return {
+        'total': totals['total'],
+        'on_sale': totals['on_sale'],
+        'categories': [
+            Facet(category.slug, category.name, by_category[category.id])
+            for category in get_categories() if category.id in by_category
+        ],
+        'price_bands': [
+            Facet(key, label, totals[f'band_{index}'])
+            for index, (key, label, low, high) in enumerate(PRICE_BANDS)
+        ],
+    }
+
+
+def get_facets(goods, scope, *params):
+    """
+    Возвращает фасеты каталога из кэша версии области или считает их.
+
+    Args:
+        goods (QuerySet): Базовый набор товаров без фильтров каталога.
+        scope (int | str): Область каталога, по версии которой
+                           сбрасывается кэш.
+        *params: Дополнительные части ключа, например поисковый запрос.
+
+    Returns:
+        dict: Результат compute_facets.
+    """
+    key = catalog_cache_key(scope, 'facets', *params)
+    facets = cache.get(key)
+    if facets is None:
+        facets = compute_facets(goods)
+        cache.set(key, facets, catalog_cache_timeout())
+    return facets
@@ -0,0 +1,33 @@
+from goods.models import Products
+from goods.utils import product_search_vector
+from marmalade_shop.batches import BatchCommand, keyset_batches, run_batches
+
+
+class Command(BatchCommand):
+    """
+    Команда для пакетного заполнения поискового вектора товаров.
+
+    Миграция заполняет вектор сама; команда нужна для строк, записанных
+    в обход триггера, и для пересчета с --all. Обновляет строки пакетами
+    по возрастанию id, чтобы не держать блокировку на всей таблице.
+    """
+    help = 'Заполняет поле search_vector товаров пакетами'
+    progress_label = 'Обновлено товаров'
+    done_message = ('Поисковый вектор заполнен, всего обновлено: {total}, '
+                    'за {elapsed:.2f} с')
+
+    def add_arguments(self, parser):
+        super().add_arguments(parser)
+        parser.add_argument(
+            '--all', action='store_true',
+            help='Пересчитать вектор у всех товаров, а не только у пустых')
+
+    def process(self, batch_size, pause, progress, **options):
+        products = Products.objects.all()
+        if not options['all']:
+            products = products.filter(search_vector__isnull=True)
+        return run_batches(
+            keyset_batches(products, 'id', batch_size),
+            lambda ids: Products.objects.filter(id__in=ids).update(
+                search_vector=product_search_vector()),
+            pause=pause, progress=progress)
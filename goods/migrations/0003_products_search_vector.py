@@ -0,0 +1,54 @@
+# Generated by Django 4.2.11 on 2026-10-18 15:06
+
+import django.contrib.postgres.indexes
+import django.contrib.postgres.search
+from django.db import migrations
+
+
+# Триггер поддерживает вектор в актуальном состоянии при save(), update(),
+# bulk_update() и loaddata. Выражение совпадает с SearchVector("name",
+# "description"), которое раньше строилось в q_search на лету. Существующие
+# строки заполняются здесь же, чтобы поиск не опустел до пересчета.
+SEARCH_VECTOR_TRIGGER = """
+CREATE OR REPLACE FUNCTION product_search_vector_update() RETURNS trigger AS $$
+BEGIN
+    NEW.search_vector := to_tsvector(
+        COALESCE(NEW.name, '') || ' ' || COALESCE(NEW.description, '')
+    );
+    RETURN NEW;
+END
+$$ LANGUAGE plpgsql;
+
+CREATE TRIGGER product_search_vector_trigger
+BEFORE INSERT OR UPDATE OF name, description ON product
+FOR EACH ROW EXECUTE FUNCTION product_search_vector_update();
+
+UPDATE product SET search_vector = to_tsvector(
+    COALESCE(name, '') || ' ' || COALESCE(description, '')
+);
+"""
+
+DROP_SEARCH_VECTOR_TRIGGER = """
+DROP TRIGGER IF EXISTS product_search_vector_trigger ON product;
+DROP FUNCTION IF EXISTS product_search_vector_update();
+"""
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('goods', '0002_alter_products_options'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='products',
+            name='search_vector',
+            field=django.contrib.postgres.search.SearchVectorField(blank=True, editable=False, null=True, verbose_name='Поисковый вектор'),
+        ),
+        migrations.AddIndex(
+            model_name='products',
+            index=django.contrib.postgres.indexes.GinIndex(fields=['search_vector'], name='product_search_vector_idx'),
+        ),
+        migrations.RunSQL(SEARCH_VECTOR_TRIGGER, DROP_SEARCH_VECTOR_TRIGGER),
+    ]
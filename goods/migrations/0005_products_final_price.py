@@ -0,0 +1,51 @@
+# Generated by Django 4.2.11 on 2026-10-18 15:12
+
+from django.db import migrations, models
+
+
+# Триггер пересчитывает цену со скидкой по той же формуле, что и
+# Products.discounted_price(), при любом изменении цены или скидки,
+# включая update() и bulk_update().
+FINAL_PRICE_TRIGGER = """
+CREATE OR REPLACE FUNCTION product_final_price_update() RETURNS trigger AS $$
+BEGIN
+    NEW.final_price := ROUND(NEW.price - NEW.price * NEW.discount / 100, 2);
+    RETURN NEW;
+END
+$$ LANGUAGE plpgsql;
+
+CREATE TRIGGER product_final_price_trigger
+BEFORE INSERT OR UPDATE OF price, discount, final_price ON product
+FOR EACH ROW EXECUTE FUNCTION product_final_price_update();
+
+UPDATE product SET final_price = ROUND(price - price * discount / 100, 2);
+"""
+
+DROP_FINAL_PRICE_TRIGGER = """
+DROP TRIGGER IF EXISTS product_final_price_trigger ON product;
+DROP FUNCTION IF EXISTS product_final_price_update();
+"""
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('goods', '0004_products_updated_at'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='products',
+            name='final_price',
+            field=models.DecimalField(decimal_places=2, default=0.0, editable=False, max_digits=7, verbose_name='Цена со скидкой'),
+        ),
+        migrations.RunSQL(FINAL_PRICE_TRIGGER, DROP_FINAL_PRICE_TRIGGER),
+        migrations.AddIndex(
+            model_name='products',
+            index=models.Index(fields=['category', 'final_price'], name='product_category_final_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='products',
+            index=models.Index(fields=['final_price'], name='product_final_price_idx'),
+        ),
+    ]
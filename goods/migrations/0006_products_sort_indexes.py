@@ -0,0 +1,21 @@
+# Generated by Django 4.2.11 on 2026-10-18 15:13
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('goods', '0005_products_final_price'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='products',
+            index=models.Index(fields=['category', 'id'], name='product_category_id_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='products',
+            index=models.Index(condition=models.Q(('discount__gt', 0)), fields=['category', 'final_price'], name='product_on_sale_idx'),
+        ),
+    ]
@@ -0,0 +1,24 @@
+# Generated by Django 4.2.11 on 2026-10-18 19:10
+
+from django.db import migrations, models
+import django.utils.timezone
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('goods', '0006_products_sort_indexes'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='products',
+            name='updated_at',
+            field=models.DateTimeField(default=django.utils.timezone.now, editable=False, verbose_name='Дата изменения'),
+        ),
+        # Значение по умолчанию на стороне БД для вставок в обход ORM
+        migrations.RunSQL(
+            'ALTER TABLE product ALTER COLUMN updated_at SET DEFAULT now();',
+            'ALTER TABLE product ALTER COLUMN updated_at DROP DEFAULT;',
+        ),
+    ]
@@ -1,5 +1,10 @@
+from decimal import ROUND_HALF_UP, Decimal
+
+from django.contrib.postgres.indexes import GinIndex
+from django.contrib.postgres.search import SearchVectorField
 from django.db import models
 from django.urls import reverse
+from django.utils import timezone
 
 
 class Categories(models.Model):
@@ -36,9 +41,15 @@ class Products(models.Model):
         image (ImageField): Изображение продукта.
         price (DecimalField): Цена продукта.
         discount (DecimalField): Процент скидки на продукт.
+        final_price (DecimalField): Цена с учетом скидки, поддерживается
+                                    триггером БД для сортировки и
+                                    фильтрации в SQL.
         quantity (PositiveIntegerField): Количество доступных единиц продукта.
         category (ForeignKey): Ссылка по внешнему ключу на модель категории,
                                к которой принадлежит продукт.
+        search_vector (SearchVectorField): Поисковый вектор по названию и
+                                           описанию, заполняется триггером БД.
+        updated_at (DateTimeField): Дата последнего изменения продукта.
     """
     name = models.CharField(max_length=150, unique=True,
                             verbose_name='Название')
@@ -54,20 +65,59 @@ class Products(models.Model):
     discount = models.DecimalField(
         default=0.00, max_digits=7, decimal_places=2,
         verbose_name='Скидка в процентах')
+    final_price = models.DecimalField(
+        default=0.00, max_digits=7, decimal_places=2, editable=False,
+        verbose_name='Цена со скидкой')
     quantity = models.PositiveIntegerField(
         default=0, verbose_name='Количество')
     category = models.ForeignKey(
         to=Categories, on_delete=models.CASCADE, verbose_name='Категория')
+    search_vector = SearchVectorField(
+        blank=True, null=True, editable=False,
+        verbose_name='Поисковый вектор')
+    # Не auto_now: значение по умолчанию нужно и при загрузке фикстур,
+    # которые сохраняют объекты без вызова save()
+    updated_at = models.DateTimeField(
+        default=timezone.now, editable=False, verbose_name='Дата изменения')
 
     class Meta:
         db_table = 'product'
         verbose_name = 'Продукт'
         verbose_name_plural = 'Продукты'
         ordering = ('id', )
+        indexes = [
+            GinIndex(fields=['search_vector'],
+                     name='product_search_vector_idx'),
+            models.Index(fields=['category', 'final_price'],
+                         name='product_category_final_idx'),
+            models.Index(fields=['final_price'],
+                         name='product_final_price_idx'),
+            models.Index(fields=['category', 'id'],
+                         name='product_category_id_idx'),
+            # Частичный индекс для фильтра "Товары по акции"
+            models.Index(fields=['category', 'final_price'],
+                         condition=models.Q(discount__gt=0),
+                         name='product_on_sale_idx'),
+        ]
 
     def __str__(self):
         return f'{self.name} В наличии {self.quantity}'
 
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        instance = super().from_db(db, field_names, values)
+        # Исходные категория и слаг нужны, чтобы при переносе или
+        # переименовании товара сбросить кэш и по старым значениям
+        instance._loaded_values = dict(zip(field_names, values))
+        return instance
+
+    def save(self, *args, **kwargs):
+        # В БД цену со скидкой пересчитывает триггер, здесь она обновляется
+        # для уже загруженного объекта
+        self.final_price = self.discounted_price()
+        self.updated_at = timezone.now()
+        super().save(*args, **kwargs)
+
     def get_absolute_url(self):
         return reverse('catalog:product', kwargs={'product_slug': self.slug})
 
@@ -84,9 +134,15 @@ class Products(models.Model):
         """
         Вычисляет цену товара с учетом скидки.
 
+        Округляет половину копейки от нуля, как ROUND в триггере
+        final_price, иначе цена на странице и цена в БД (сортировка,
+        фильтр цен, итоги корзины) расходились бы на копейку.
+
         Returns:
-            float: Цена с учетом скидки.
+            Decimal: Цена с учетом скидки.
         """
         if self.discount:
-            return round(self.price - self.price * self.discount / 100, 2)
+            price = Decimal(str(self.price))
+            discounted = price - price * Decimal(str(self.discount)) / 100
+            return discounted.quantize(Decimal('0.01'), ROUND_HALF_UP)
         return self.price
@@ -0,0 +1,183 @@
+import base64
+import binascii
+import json
+
+from django.core.exceptions import ValidationError
+from django.db.models import Q
+
+
+class InvalidCursor(ValueError):
+    """Курсор поврежден или выдан для другой сортировки."""
+
+
+class KeysetPage:
+    """
+    Страница, полученная по курсору.
+
+    Повторяет ту часть интерфейса django.core.paginator.Page, которая нужна
+    шаблону каталога, и вместо номеров страниц отдает курсоры соседних
+    страниц.
+
+    Args:
+        object_list (list): Объекты текущей страницы.
+        next_cursor (str, optional): Курсор следующей страницы.
+        previous_cursor (str, optional): Курсор предыдущей страницы.
+    """
+
+    def __init__(self, object_list, next_cursor=None, previous_cursor=None):
+        self.object_list = object_list
+        self.next_cursor = next_cursor
+        self.previous_cursor = previous_cursor
+
+    def __repr__(self):
+        return f'<KeysetPage of {len(self.object_list)} objects>'
+
+    def __len__(self):
+        return len(self.object_list)
+
+    def __iter__(self):
+        return iter(self.object_list)
+
+    def __getitem__(self, index):
+        return self.object_list[index]
+
+    def has_next(self):
+        return self.next_cursor is not None
+
+    def has_previous(self):
+        return self.previous_cursor is not None
+
+
+class KeysetPaginator:
+    """
+    Пагинатор по ключу сортировки (keyset / cursor pagination).
+
+    В отличие от django.core.paginator.Paginator не выполняет COUNT(*) и
+    OFFSET: следующая страница отбирается условием "после последней строки
+    текущей", поэтому время выборки не растет с номером страницы.
+
+    Args:
+        queryset (QuerySet): Набор объектов для постраничного вывода.
+        per_page (int): Количество объектов на странице.
+        ordering (tuple): Поля сортировки; последнее поле должно быть
+                          уникальным (обычно 'id'), все поля сортируются
+                          в одном направлении.
+    """
+
+    def __init__(self, queryset, per_page, ordering):
+        self.queryset = queryset
+        self.per_page = per_page
+        self.ordering = tuple(ordering)
+        self.descending = self.ordering[0].startswith('-')
+        self.fields = tuple(field.lstrip('-') for field in self.ordering)
+
+    def page(self, cursor=None):
+        """
+        Возвращает страницу, на которую указывает курсор.
+
+        Args:
+            cursor (str, optional): Курсор из next_cursor/previous_cursor
+                                    предыдущей страницы; без него
+                                    возвращается первая страница.
+
+        Returns:
+            KeysetPage: Страница объектов.
+
+        Raises:
+            InvalidCursor: Если курсор не удалось разобрать.
+        """
+        if not cursor:
+            rows = list(self.queryset.order_by(*self.ordering)
+                        [:self.per_page + 1])
+            return self._build_page(rows, has_previous=False)
+
+        queryset, backwards = self._seek_queryset(cursor)
+        if not backwards:
+            rows = list(queryset.order_by(*self.ordering)
+                        [:self.per_page + 1])
+            return self._build_page(rows, has_previous=True)
+
+        rows = list(queryset.order_by(*self._reversed_ordering())
+                    [:self.per_page + 1])
+        has_previous = len(rows) > self.per_page
+        rows = rows[:self.per_page][::-1]
+        return KeysetPage(
+            rows,
+            next_cursor=self.encode_cursor(rows[-1]) if rows else None,
+            previous_cursor=(self.encode_cursor(rows[0], backwards=True)
+                             if has_previous else None),
+        )
+
+    def clean_cursor(self, cursor):
+        """
+        Возвращает курсор, если он подходит этому пагинатору, иначе None.
+
+        Проверка не выполняет запросов, поэтому ей можно нормализовать
+        курсор до обращения к кэшу.
+        """
+        if not cursor:
+            return None
+        try:
+            self._seek_queryset(cursor)
+        except InvalidCursor:
+            return None
+        return cursor
+
+    def _seek_queryset(self, cursor):
+        values, backwards = self.decode_cursor(cursor)
+        try:
+            queryset = self.queryset.filter(self._seek(values, backwards))
+        except (ValueError, TypeError, ValidationError):
+            # Значения поддельного курсора не приводятся к типам полей
+            raise InvalidCursor(cursor)
+        return queryset, backwards
+
+    def _build_page(self, rows, has_previous):
+        has_next = len(rows) > self.per_page
+        rows = rows[:self.per_page]
+        return KeysetPage(
+            rows,
+            next_cursor=self.encode_cursor(rows[-1]) if has_next else None,
+            previous_cursor=(self.encode_cursor(rows[0], backwards=True)
+                             if has_previous and rows else None),
+        )
+
+    def _reversed_ordering(self):
+        if self.descending:
+            return self.fields
+        return tuple(f'-{field}' for field in self.fields)
+
+    def _seek(self, values, backwards):
+        """
+        Строит условие "строго после" (или "строго до") ключа курсора:
+        (a > x) OR (a = x AND b > y) для сортировки по (a, b).
+        """
+        lookup = 'lt' if self.descending != backwards else 'gt'
+        condition = Q()
+        equal = {}
+        for field, value in zip(self.fields, values):
+            condition |= Q(**equal, **{f'{field}__{lookup}': value})
+            equal[field] = value
+        return condition
+
+    def encode_cursor(self, obj, backwards=False):
+        payload = {
+            'o': self.ordering,
+            'v': [getattr(obj, field) for field in self.fields],
+            'b': backwards,
+        }
+        data = json.dumps(payload, default=str, separators=(',', ':'))
+        return base64.urlsafe_b64encode(data.encode()).decode().rstrip('=')
+
+    def decode_cursor(self, cursor):
+        try:
+            data = base64.urlsafe_b64decode(cursor + '=' * (-len(cursor) % 4))
+            payload = json.loads(data)
+            ordering = tuple(payload['o'])
+            values = list(payload['v'])
+            backwards = bool(payload['b'])
+        except (binascii.Error, ValueError, TypeError, KeyError):
+            raise InvalidCursor(cursor)
+        if ordering != self.ordering or len(values) != len(self.fields):
+            raise InvalidCursor(cursor)
+        return values, backwards
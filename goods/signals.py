@@ -0,0 +1,73 @@
+from django.db import transaction
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import receiver
+
+from goods.cache import (
+    CATALOG_SCOPE_ALL, CATALOG_SCOPE_CATEGORIES, bump_catalog_version,
+    catalog_version, invalidate_product
+)
+from goods.models import Categories, Products
+from goods.suggest import suggest_index
+
+
+@receiver([post_save, post_delete], sender=Products)
+def invalidate_product_catalog(sender, instance, **kwargs):
+    """
+    Сбрасывает кэш каталога для категорий товара и кэш самого товара при
+    его изменении.
+
+    Срабатывает и на правку цены и скидки через list_editable в админке,
+    так как она сохраняет товары через save(). При переносе товара в
+    другую категорию сбрасываются обе категории, при смене слага — оба
+    адреса товара.
+
+    Сброс выполняется после фиксации транзакции: иначе параллельный
+    запрос успел бы прочитать еще старую строку и закэшировать ее под
+    новой версией.
+    """
+    loaded = getattr(instance, '_loaded_values', {})
+    scopes = (CATALOG_SCOPE_ALL, instance.category_id,
+              loaded.get('category_id'))
+    slugs = (instance.slug, loaded.get('slug'))
+
+    def invalidate():
+        bump_catalog_version(*scopes)
+        invalidate_product(*slugs)
+
+    transaction.on_commit(invalidate)
+
+
+@receiver([post_save, post_delete], sender=Products)
+def update_suggest_index(sender, instance, signal, **kwargs):
+    """
+    Точечно обновляет префиксный индекс подсказок после изменения товара.
+
+    Обновление применяется после фиксации транзакции и только если
+    индекс был актуален до этого изменения (версия каталога выросла
+    ровно на единицу); иначе индекс перестроится целиком при следующем
+    запросе подсказок. Откаченное изменение в индекс не попадает.
+    """
+    deleted = signal is post_delete
+    pk, name, slug = instance.pk, instance.name, instance.slug
+
+    def update():
+        version = catalog_version(CATALOG_SCOPE_ALL)
+        if (suggest_index.version is None
+                or suggest_index.version + 1 != version):
+            return
+        if deleted:
+            suggest_index.remove(pk, version)
+        else:
+            suggest_index.update(pk, name, slug, version)
+
+    transaction.on_commit(update)
+
+
+@receiver([post_save, post_delete], sender=Categories)
+def invalidate_category_catalog(sender, instance, **kwargs):
+    """
+    Сбрасывает кэш каталога и меню категорий при изменении или удалении
+    категории после фиксации транзакции.
+    """
+    scopes = (CATALOG_SCOPE_ALL, CATALOG_SCOPE_CATEGORIES, instance.pk)
+    transaction.on_commit(lambda: bump_catalog_version(*scopes))
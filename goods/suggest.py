@@ -0,0 +1,130 @@
+import bisect
+import threading
+
+from goods.cache import CATALOG_SCOPE_ALL, catalog_version
+from goods.models import Products
+
+
+class PrefixIndex:
+    """
+    Отсортированный префиксный индекс названий товаров в памяти процесса.
+
+    Каждый товар попадает в индекс по полному названию и по каждому слову
+    названия, поэтому "мар" находит и "Мармеладные мишки", и
+    "Желейный мармелад". Поиск выполняется бинарным поиском по
+    отсортированному списку без обращения к БД.
+
+    Индекс привязан к версии каталога: изменения товаров в текущем
+    процессе применяются к нему точечно, а изменения из других процессов
+    обнаруживаются по смене версии и ведут к полной перестройке.
+    """
+
+    def __init__(self):
+        self.version = None
+        self._terms = []  # Отсортированные пары (термин, id товара)
+        self._products = {}  # id товара -> (название, слаг)
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def _split(name):
+        name = name.lower()
+        return {name, *name.split()}
+
+    def rebuild(self, rows, version):
+        """
+        Полностью перестраивает индекс.
+
+        Args:
+            rows (iterable): Кортежи (id, название, слаг).
+            version (int): Версия каталога, которой соответствуют данные.
+        """
+        products = {}
+        terms = []
+        for product_id, name, slug in rows:
+            products[product_id] = (name, slug)
+            terms.extend((term, product_id) for term in self._split(name))
+        terms.sort()
+        with self._lock:
+            self._products = products
+            self._terms = terms
+            self.version = version
+
+    def _remove(self, product_id):
+        product = self._products.pop(product_id, None)
+        if product is None:
+            return
+        for term in self._split(product[0]):
+            index = bisect.bisect_left(self._terms, (term, product_id))
+            if index < len(self._terms) and \
+                    self._terms[index] == (term, product_id):
+                del self._terms[index]
+
+    def update(self, product_id, name, slug, version):
+        """
+        Добавляет товар в индекс или обновляет его запись.
+        """
+        with self._lock:
+            self._remove(product_id)
+            self._products[product_id] = (name, slug)
+            for term in self._split(name):
+                bisect.insort(self._terms, (term, product_id))
+            self.version = version
+
+    def remove(self, product_id, version):
+        """
+        Удаляет товар из индекса.
+        """
+        with self._lock:
+            self._remove(product_id)
+            self.version = version
+
+    def search(self, prefix, limit):
+        """
+        Ищет товары, название или слово названия которых начинается с
+        префикса.
+
+        Args:
+            prefix (str): Префикс без учета регистра.
+            limit (int): Максимальное количество результатов.
+
+        Returns:
+            list: Пары (название, слаг) в алфавитном порядке терминов.
+        """
+        prefix = prefix.lower()
+        found = {}
+        with self._lock:
+            index = bisect.bisect_left(self._terms, (prefix,))
+            while index < len(self._terms) and len(found) < limit:
+                term, product_id = self._terms[index]
+                if not term.startswith(prefix):
+                    break
+                found.setdefault(product_id, self._products[product_id])
+                index += 1
+        return list(found.values())
+
+
+suggest_index = PrefixIndex()
+
+
+def suggest_products(prefix, limit=10):
+    """
+    Возвращает подсказки товаров для строки поиска.
+
+    При первом обращении и после изменения каталога в другом процессе
+    индекс перестраивается одним запросом (id, название, слаг).
+
+    Args:
+        prefix (str): Начало названия, введенное пользователем.
+        limit (int): Максимальное количество подсказок.
+
+    Returns:
+        list: Пары (название, слаг).
+    """
+    prefix = prefix.strip()
+    if not prefix:
+        return []
+    version = catalog_version(CATALOG_SCOPE_ALL)
+    if suggest_index.version != version:
+        suggest_index.rebuild(
+            Products.objects.values_list('id', 'name', 'slug'), version)
+    return suggest_index.search(prefix, limit)
@@ -1,7 +1,7 @@
 from django import template
 from django.utils.http import urlencode
 
-from goods.models import Categories
+from goods.cache import get_categories
 
 
 register = template.Library()
@@ -9,11 +9,17 @@ register = template.Library()
 
 @register.simple_tag()
 def tag_categories():
-    return Categories.objects.all()
+    return get_categories()
 
 
 @register.simple_tag(takes_context=True)
 def change_params(context, **kwargs):
     query = context['request'].GET.dict()
+    # Номер страницы и курсор взаимоисключающие: задание одного сбрасывает
+    # другой, чтобы ссылки не смешивали два режима пагинации
+    if 'cursor' in kwargs:
+        query.pop('page', None)
+    if 'page' in kwargs:
+        query.pop('cursor', None)
     query.update(kwargs)
     return urlencode(query)
@@ -0,0 +1,20 @@
+from goods.models import Categories, Products
+
+
+def create_product(name='Мишки', slug='bears', **fields):
+    """
+    Создает товар в категории «Мармелад» для тестов.
+
+    Args:
+        name (str): Название товара.
+        slug (str): Слаг товара.
+        **fields: Остальные поля товара; цена по умолчанию 100.
+
+    Returns:
+        Products: Созданный товар.
+    """
+    category, _ = Categories.objects.get_or_create(
+        name='Мармелад', slug='marmalade')
+    fields.setdefault('price', 100)
+    return Products.objects.create(
+        name=name, slug=slug, category=category, **fields)
@@ -1,3 +1,184 @@
-from django.test import TestCase
+import base64
+import json
+from decimal import Decimal
+from unittest import mock, skipUnless
 
-# Create your tests here.
+from django.db import connection
+from django.test import SimpleTestCase, TestCase
+
+from goods.cache import CacheInfo, LRUCache
+from goods.models import Products
+from goods.paginators import InvalidCursor, KeysetPaginator
+from goods.suggest import PrefixIndex
+from goods.testing import create_product
+
+
+def make_cursor(payload):
+    data = json.dumps(payload).encode()
+    return base64.urlsafe_b64encode(data).decode().rstrip('=')
+
+
+class KeysetPaginatorCursorTest(SimpleTestCase):
+    """
+    Поврежденный или поддельный курсор должен давать InvalidCursor, а не
+    ошибку сервера; до запроса к БД дело не доходит.
+    """
+
+    def setUp(self):
+        self.paginator = KeysetPaginator(
+            Products.objects.all(), 9, ('final_price', 'id'))
+
+    def assertInvalid(self, cursor):
+        with self.assertRaises(InvalidCursor):
+            self.paginator.page(cursor)
+
+    def test_garbage_cursor(self):
+        self.assertInvalid('not-a-cursor')
+        self.assertInvalid(make_cursor([1, 2]))
+
+    def test_other_ordering(self):
+        self.assertInvalid(make_cursor({'o': ['id'], 'v': [1], 'b': False}))
+
+    def test_tampered_values(self):
+        ordering = ['final_price', 'id']
+        for values in (['1.00', 'abc'], ['abc', 1], [[1], 1], [1, {}], 5):
+            with self.subTest(values=values):
+                self.assertInvalid(
+                    make_cursor({'o': ordering, 'v': values, 'b': False}))
+
+    def test_round_trip(self):
+        product = Products(id=7, final_price='12.50')
+        cursor = self.paginator.encode_cursor(product, backwards=True)
+        self.assertEqual(
+            self.paginator.decode_cursor(cursor), (['12.50', 7], True))
+
+    def test_clean_cursor(self):
+        product = Products(id=7, final_price='12.50')
+        cursor = self.paginator.encode_cursor(product)
+        self.assertEqual(self.paginator.clean_cursor(cursor), cursor)
+        for cursor in (None, '', 'not-a-cursor', make_cursor(
+                {'o': ['final_price', 'id'], 'v': ['abc', 1], 'b': False})):
+            with self.subTest(cursor=cursor):
+                self.assertIsNone(self.paginator.clean_cursor(cursor))
+
+
+class DiscountedPriceTest(SimpleTestCase):
+    """
+    Половина копейки округляется от нуля, как ROUND в триггере
+    final_price.
+    """
+
+    def test_half_cent_rounds_up(self):
+        product = Products(price=Decimal('10.05'), discount=50)
+        self.assertEqual(product.discounted_price(), Decimal('5.03'))
+
+    def test_without_discount(self):
+        product = Products(price=Decimal('10.05'))
+        self.assertEqual(product.discounted_price(), Decimal('10.05'))
+
+
+@skipUnless(connection.vendor == 'postgresql', 'Триггер final_price')
+class FinalPriceTriggerTest(TestCase):
+    """
+    Триггер сохраняет ту же цену со скидкой, что и discounted_price().
+    """
+
+    def test_trigger_matches_python(self):
+        product = create_product(price=Decimal('10.05'), discount=50)
+        product.refresh_from_db()
+        self.assertEqual(product.final_price, product.discounted_price())
+
+
+class PrefixIndexTest(SimpleTestCase):
+    """
+    Префиксный индекс подсказок: поиск по названию и словам названия,
+    точечное обновление и удаление товаров без перестройки.
+    """
+
+    def setUp(self):
+        self.index = PrefixIndex()
+        self.index.rebuild([
+            (1, 'Мармеладные мишки', 'bears'),
+            (2, 'Желейный мармелад', 'jelly'),
+            (3, 'Червячки', 'worms'),
+        ], version=1)
+
+    def test_prefix_search(self):
+        self.assertEqual(self.index.search('МАР', 10), [
+            ('Желейный мармелад', 'jelly'),
+            ('Мармеладные мишки', 'bears'),
+        ])
+        self.assertEqual(self.index.search('мишки', 10),
+                         [('Мармеладные мишки', 'bears')])
+        self.assertEqual(self.index.search('мар', 1),
+                         [('Желейный мармелад', 'jelly')])
+        self.assertEqual(self.index.search('зефир', 10), [])
+
+    def test_update_after_rename(self):
+        self.index.update(3, 'Кислые червячки', 'worms', version=2)
+        self.assertEqual(self.index.search('кисл', 10),
+                         [('Кислые червячки', 'worms')])
+        self.assertEqual(self.index.search('черв', 10),
+                         [('Кислые червячки', 'worms')])
+        self.index.update(1, 'Мишки', 'bears', version=3)
+        self.assertEqual(self.index.search('мар', 10),
+                         [('Желейный мармелад', 'jelly')])
+        self.assertEqual(self.index.version, 3)
+
+    def test_remove(self):
+        self.index.remove(2, version=2)
+        self.assertEqual(self.index.search('мар', 10),
+                         [('Мармеладные мишки', 'bears')])
+        self.assertEqual(self.index.search('желей', 10), [])
+        # Повторное удаление и удаление неизвестного товара безопасны
+        self.index.remove(2, version=3)
+        self.index.remove(42, version=4)
+        self.assertEqual(len(self.index._terms), 4)
+        self.assertEqual(self.index.version, 4)
+
+
+class LRUCacheTest(SimpleTestCase):
+    """
+    LRU-кэш процесса: истечение записей по времени жизни, вытеснение
+    давно не использованных и счетчики попаданий и промахов.
+    """
+
+    def setUp(self):
+        patcher = mock.patch('goods.cache.time.monotonic', return_value=100)
+        self.monotonic = patcher.start()
+        self.addCleanup(patcher.stop)
+        self.cache = LRUCache(maxsize=2, ttl=10)
+
+    def test_ttl_expiry(self):
+        self.cache.set('a', 1)
+        self.monotonic.return_value = 110
+        self.assertEqual(self.cache.get('a'), 1)
+        self.monotonic.return_value = 111
+        self.assertIsNone(self.cache.get('a'))
+        self.assertEqual(self.cache.cache_info().currsize, 0)
+
+    def test_lru_eviction_order(self):
+        self.cache.set('a', 1)
+        self.cache.set('b', 2)
+        # Обращение делает 'a' свежей, вытесняется 'b'
+        self.cache.get('a')
+        self.cache.set('c', 3)
+        self.assertIsNone(self.cache.get('b'))
+        self.assertEqual(self.cache.get('a'), 1)
+        self.assertEqual(self.cache.get('c'), 3)
+        # Перезапись тоже освежает запись
+        self.cache.set('a', 4)
+        self.cache.set('d', 5)
+        self.assertIsNone(self.cache.get('c'))
+        self.assertEqual(self.cache.get('a'), 4)
+
+    def test_hit_miss_counters(self):
+        self.cache.get('a')
+        self.cache.set('a', 1)
+        self.cache.get('a')
+        self.cache.get('a')
+        self.assertEqual(self.cache.cache_info(), CacheInfo(
+            hits=2, misses=1, maxsize=2, currsize=1))
+        self.cache.clear()
+        self.assertEqual(self.cache.cache_info(), CacheInfo(
+            hits=0, misses=0, maxsize=2, currsize=0))
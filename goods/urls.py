@@ -6,6 +6,11 @@ app_name = 'catalog'  # Пространство имен для URL-адрес
 urlpatterns = [
     # Страница поиска в каталоге
     path('search/', views.CatalogView.as_view(), name='search'),
+    # Статистика кэша поиска для сотрудников
+    path('search/stats/', views.SearchCacheStatsView.as_view(),
+         name='search_stats'),
+    # Подсказки для строки поиска
+    path('suggest/', views.SuggestView.as_view(), name='suggest'),
     # Страница каталога по категориям
     path('<slug:category_slug>/', views.CatalogView.as_view(), name='index'),
     # Страница конкретного продукта
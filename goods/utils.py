@@ -1,7 +1,45 @@
+from collections.abc import Sequence
+
+from django.conf import settings
 from django.contrib.postgres.search import (
     SearchQuery, SearchVector, SearchRank, SearchHeadline
 )
+from django.db.models import F, OuterRef, Subquery, Sum
+from django.db.models.functions import Coalesce
+from django.utils import timezone
+from goods.cache import CATALOG_SCOPE_ALL, LRUCache, catalog_version
+from goods.facets import price_band_q
 from goods.models import Products
+from orders.models import StockReservation
+
+
+# Публичные ключи сортировки каталога и соответствующие им порядки.
+# Каждый порядок обслуживается индексом, id завершает ключ для
+# уникальности (нужно и для пагинации по курсору).
+CATALOG_ORDERINGS = {
+    'default': ('id',),
+    'price': ('final_price', 'id'),
+    '-price': ('-final_price', '-id'),
+}
+
+# Кэш популярных поисковых запросов в памяти процесса
+search_cache = LRUCache(
+    maxsize=getattr(settings, 'SEARCH_CACHE_SIZE', 256),
+    ttl=getattr(settings, 'SEARCH_CACHE_TTL', 60 * 5),
+)
+
+
+def product_search_vector():
+    """
+    Возвращает выражение поискового вектора товара.
+
+    Совпадает с тем, что вычисляет триггер БД для поля
+    Products.search_vector, и используется для его пакетного заполнения.
+
+    Returns:
+        SearchVector: Вектор по полям 'name' и 'description'.
+    """
+    return SearchVector("name", "description")
 
 
 def q_search(query):
@@ -10,7 +48,8 @@ def q_search(query):
 
     Может искать по id товара, если запрос состоит только из цифр и не
     превышает 5 символов, или по полям 'name' и 'description', используя
-    введенный поисковый запрос.
+    введенный поисковый запрос. Полнотекстовый поиск идет по сохраненному
+    полю 'search_vector' с GIN-индексом, а не по вектору, собранному на лету.
 
     Args:
         query (str): Строка запроса, введенная пользователем.
@@ -22,35 +61,249 @@ def q_search(query):
     # Проверка, является ли запрос числовым и длина меньше 6 (поиск по ID)
     if query.isdigit() and len(query) <= 5:
         # Возврат продуктов по ID
-        return Products.objects.filter(id=int(query))
+        return match_products(query)
 
-    # Создание вектора поиска и поискового запроса для полнотекстового поиска
-    vector = SearchVector("name", "description")
+    # Отбор совпадений по индексу
+    result = match_products(query)
+    # Создание поискового запроса для ранжирования и подсветки
     query = SearchQuery(query)
 
-    # Аннотация набора данных с рангом релевантности поиска и фильтрация
+    # Аннотация рангом релевантности
     result = (
-        Products.objects.annotate(rank=SearchRank(vector, query))
-        .filter(rank__gt=0)
+        result.annotate(rank=SearchRank(F("search_vector"), query))
         .order_by("-rank")
     )
 
-    # Добавление аннотаций для выделения найденных фрагментов
-    result = result.annotate(
+    return annotate_headlines(result, query)
+
+
+def annotate_headlines(queryset, query):
+    """
+    Добавляет к набору товаров фрагменты названия и описания с
+    подсвеченными совпадениями.
+
+    Args:
+        queryset (QuerySet): Набор товаров.
+        query (SearchQuery): Поисковый запрос.
+
+    Returns:
+        QuerySet: Набор с аннотациями 'headline' и 'bodyline'.
+    """
+    return queryset.annotate(
         headline=SearchHeadline(
             "name",
             query,
             start_sel='<span style="background-color: yellow;">',
             stop_sel="</span>",
-        )
-    )
-    result = result.annotate(
+        ),
         bodyline=SearchHeadline(
             "description",
             query,
             start_sel='<span style="background-color: yellow;">',
             stop_sel="</span>",
-        )
+        ),
     )
 
-    return result
+
+def match_products(query):
+    """
+    Возвращает товары, подходящие под поисковый запрос, без ранжирования
+    и подсветки — например, для подсчета фасетов по результату поиска.
+
+    Args:
+        query (str): Строка запроса, введенная пользователем.
+
+    Returns:
+        QuerySet: Набор найденных товаров.
+    """
+    if query.isdigit() and len(query) <= 5:
+        return Products.objects.filter(id=int(query))
+    return Products.objects.filter(search_vector=SearchQuery(query))
+
+
+def filter_products(goods, on_sale=None, order_by=None, price=None):
+    """
+    Применяет к набору товаров фильтры по скидке и цене и сортировку из
+    параметров каталога.
+
+    Args:
+        goods (QuerySet): Набор товаров.
+        on_sale (str, optional): Показывать только товары со скидкой.
+        order_by (str, optional): Поле сортировки или 'default'.
+        price (str, optional): Ключ ценового диапазона из PRICE_BANDS.
+
+    Returns:
+        QuerySet: Отфильтрованный и отсортированный набор.
+    """
+    if on_sale:
+        goods = goods.filter(discount__gt=0)  # Товары со скидкой
+    band = price_band_q(price) if price else None
+    if band is not None:
+        goods = goods.filter(band)  # Товары ценового диапазона
+    if order_by != 'default' and order_by in CATALOG_ORDERINGS:
+        # Сортировка товаров; для 'default' сохраняется исходный порядок,
+        # например по релевантности в поиске
+        goods = goods.order_by(*CATALOG_ORDERINGS[order_by])
+    return goods
+
+
+def clean_ordering(order_by):
+    """
+    Проверяет ключ сортировки по реестру CATALOG_ORDERINGS.
+
+    Args:
+        order_by (str | None): Ключ сортировки из запроса.
+
+    Returns:
+        str: Тот же ключ или 'default', если он неизвестен.
+    """
+    return order_by if order_by in CATALOG_ORDERINGS else 'default'
+
+
+def normalize_query(query):
+    """
+    Приводит поисковый запрос к виду для ключа кэша: нижний регистр,
+    одиночные пробелы между словами.
+    """
+    return ' '.join(query.lower().split())
+
+
+class SearchHits:
+    """
+    Закэшированный результат поиска: id найденных товаров в порядке
+    выдачи и уже вычисленные фрагменты с подсветкой.
+
+    Фрагменты считаются не для всей выдачи сразу, а для каждой открытой
+    страницы, и сохраняются здесь же, поэтому повторный показ страницы
+    обходится без SearchHeadline.
+
+    Args:
+        query (str | None): Текст запроса или None для поиска по id.
+        ids (tuple): id товаров в порядке выдачи.
+    """
+
+    def __init__(self, query, ids):
+        self.query = query
+        self.ids = ids
+        self.fragments = {}  # id товара -> (headline, bodyline)
+
+
+class SearchResults(Sequence):
+    """
+    Последовательность товаров из закэшированного результата поиска.
+
+    Пагинатор берет у нее длину и срез страницы; товары среза загружаются
+    одним запросом по id.
+
+    Args:
+        hits (SearchHits): Закэшированный результат поиска.
+    """
+
+    def __init__(self, hits):
+        self.hits = hits
+
+    def __len__(self):
+        return len(self.hits.ids)
+
+    def __getitem__(self, index):
+        if not isinstance(index, slice):
+            return self[index:index + 1][0]
+        return self._load(self.hits.ids[index])
+
+    def _load(self, ids):
+        hits = self.hits
+        products = Products.objects.filter(id__in=ids)
+        missing = hits.query is not None and any(
+            pk not in hits.fragments for pk in ids)
+        if missing:
+            products = annotate_headlines(products, SearchQuery(hits.query))
+        products = {product.id: product for product in products}
+
+        result = []
+        for pk in ids:
+            product = products.get(pk)
+            if product is None:
+                continue  # Товар удален после кэширования выдачи
+            if missing:
+                hits.fragments[pk] = (product.headline, product.bodyline)
+            elif pk in hits.fragments:
+                product.headline, product.bodyline = hits.fragments[pk]
+            result.append(product)
+        return result
+
+
+def search_products(query, on_sale=None, order_by=None, price=None):
+    """
+    Выполняет поиск через q_search с кэшированием популярных запросов.
+
+    Ключ кэша составляют нормализованный запрос, фильтры и версия
+    каталога, поэтому любое изменение товаров делает старые результаты
+    недоступными. В кэше хранятся id товаров в порядке выдачи и
+    фрагменты с подсветкой, а не сами объекты.
+
+    Args:
+        query (str): Строка запроса, введенная пользователем.
+        on_sale (str, optional): Показывать только товары со скидкой.
+        order_by (str, optional): Ключ сортировки из CATALOG_ORDERINGS.
+        price (str, optional): Ключ ценового диапазона из PRICE_BANDS.
+
+    Returns:
+        SearchResults: Последовательность найденных товаров.
+    """
+    query = normalize_query(query)
+    order_by = clean_ordering(order_by)
+    key = (query, bool(on_sale), order_by, price,
+           catalog_version(CATALOG_SCOPE_ALL))
+    hits = search_cache.get(key)
+    if hits is None:
+        goods = filter_products(q_search(query), on_sale, order_by, price)
+        ids = tuple(goods.values_list('id', flat=True))
+        # Поиск по id не подсвечивает совпадения
+        by_id = query.isdigit() and len(query) <= 5
+        hits = SearchHits(None if by_id else query, ids)
+        search_cache.set(key, hits)
+    return SearchResults(hits)
+
+
+def with_available_stock(products, exclude_user=None):
+    """
+    Добавляет к товарам доступный остаток: количество на складе минус
+    активные резервы.
+
+    Сумма резервов считается подзапросом по индексу (product,
+    expires_at), поэтому остаток любого набора товаров читается одним
+    запросом.
+
+    Args:
+        products (QuerySet): Набор товаров.
+        exclude_user (User, optional): Не учитывать резервы этого
+                                       пользователя, например при
+                                       оформлении его заказа.
+
+    Returns:
+        QuerySet: Товары с полем available.
+    """
+    reservations = StockReservation.objects.filter(
+        product=OuterRef('pk'), expires_at__gt=timezone.now())
+    if exclude_user is not None:
+        reservations = reservations.exclude(user=exclude_user)
+    reserved = reservations.values('product').annotate(
+        total=Sum('quantity')).values('total')
+    return products.annotate(
+        available=F('quantity') - Coalesce(Subquery(reserved), 0))
+
+
+def available_stock(product_ids):
+    """
+    Возвращает доступный остаток товаров одним запросом.
+
+    Args:
+        product_ids (iterable): id товаров.
+
+    Returns:
+        dict: Доступное количество по id товара.
+    """
+    return dict(
+        with_available_stock(Products.objects.filter(id__in=product_ids))
+        .values_list('id', 'available')
+    )
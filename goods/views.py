@@ -1,8 +1,26 @@
+from django.conf import settings
+from django.contrib.admin.views.decorators import staff_member_required
+from django.core.cache import cache
 from django.core.paginator import Paginator
-from django.shortcuts import get_list_or_404, render
+from django.http import Http404, JsonResponse
+from django.shortcuts import render
+from django.utils.decorators import method_decorator
 from django.views import View
+from django.views.decorators.http import condition
+
+from carts.utils import get_cart_summary
+from goods.cache import (
+    CATALOG_SCOPE_ALL, catalog_cache_key, catalog_cache_timeout,
+    detach_page, get_cached_product, get_category_by_slug
+)
+from goods.facets import get_facets, price_band_q
 from goods.models import Products
-from goods.utils import q_search
+from goods.paginators import InvalidCursor, KeysetPaginator
+from goods.suggest import suggest_products
+from goods.utils import (
+    CATALOG_ORDERINGS, available_stock, clean_ordering, filter_products,
+    match_products, normalize_query, search_cache, search_products
+)
 
 
 class CatalogView(View):
@@ -10,55 +28,172 @@ class CatalogView(View):
     Представление для отображения списка товаров в каталоге.
 
     Отображает товары по категории или поисковому запросу с возможностью
-    сортировки и фильтрации.
+    сортировки и фильтрации. Большие разделы листаются по курсору (без
+    COUNT и OFFSET), небольшие категории и результаты поиска — по номерам
+    страниц. Страницы разделов кэшируются до изменения товаров или
+    категорий раздела. Для фильтров выводятся количества товаров (фасеты),
+    посчитанные одним запросом. Доступный остаток товаров страницы
+    читается отдельным запросом, так как меняется с каждым резервом.
 
     Args:
         request (HttpRequest): объект запроса от пользователя.
         category_slug (str, optional): слаг категории товаров для фильтрации,
                                        или 'all' для показа всех товаров.
     """
+    paginate_by = 9  # Количество товаров на странице
+    # Разделы, которые по умолчанию листаются по курсору
+    cursor_slugs = ('all',)
 
     def get(self, request, category_slug=None):
         # Получение параметров из запроса
         page = request.GET.get('page', 1)
+        cursor = request.GET.get('cursor', None)
         on_sale = request.GET.get('on_sale', None)
-        order_by = request.GET.get('order_by', None)
+        price = request.GET.get('price', None)
+        # Неизвестные ключи сортировки заменяются сортировкой по умолчанию
+        order_by = clean_ordering(request.GET.get('order_by', None))
         query = request.GET.get('q', None)
+        # Неизвестный ценовой диапазон не фильтрует товары
+        if price_band_q(price) is None:
+            price = None
 
         # Фильтрация товаров в зависимости от категории или поискового запроса
+        cache_key = None
+        facet_params = ()
         if category_slug == 'all':
             goods = Products.objects.all()  # Получение всех товаров,если 'all'
+            scope = CATALOG_SCOPE_ALL
         elif query:
-            goods = q_search(query)  # Поиск товаров по заданному запросу
+            # Поиск товаров по заданному запросу, фильтры применяются
+            # внутри, чтобы попасть в ключ кэша поиска
+            goods = match_products(query)
+            scope = CATALOG_SCOPE_ALL
+            facet_params = (normalize_query(query),)
         else:
-            # Получение товаров по слагу или 404, если ничего не найдено
-            goods = get_list_or_404(
-                Products.objects.filter(category__slug=category_slug))
+            # Получение товаров категории или 404, если категории нет
+            category = get_category_by_slug(category_slug)
+            if category is None:
+                raise Http404('Категория не найдена')
+            goods = Products.objects.filter(category_id=category.id)
+            scope = category.id
 
-        # Применение фильтров и сортировки
-        if on_sale:
-            goods = goods.filter(discount__gt=0)  # Товары со скидкой
-        if order_by and order_by != 'default':
-            goods = goods.order_by(order_by)  # Сортировка товаров
+        # Параметры нормализуются до построения ключа кэша, чтобы
+        # произвольные значения не порождали новые записи: поврежденный
+        # курсор равен отсутствию курсора, а номер страницы в режиме
+        # курсора не используется
+        cursor = KeysetPaginator(
+            goods, self.paginate_by, CATALOG_ORDERINGS[order_by]
+        ).clean_cursor(cursor)
+        cursor_mode = bool(
+            not query and (cursor or category_slug in self.cursor_slugs))
+        if cursor_mode:
+            page = None
+        if category_slug == 'all' or not query:
+            cache_key = catalog_cache_key(
+                scope, bool(on_sale), order_by, price, page, cursor)
 
-        # Пагинация
-        # Создание пагинатора для товаров, по 9 на страницу
-        paginator = Paginator(goods, 9)
-        current_page = paginator.page(int(page))  # Получение текущей страницы
+        # Фасеты считаются по набору до фильтров, чтобы показать, сколько
+        # товаров даст каждый вариант фильтра
+        facets = get_facets(goods, scope, *facet_params)
+
+        listing = cache.get(cache_key) if cache_key else None
+        if listing is None:
+            if query:
+                goods = search_products(query, on_sale, order_by, price)
+            else:
+                goods = filter_products(goods, on_sale, order_by, price)
+            listing = self.get_listing(
+                goods, order_by, page, cursor, cursor_mode)
+            if cache_key:
+                cache.set(cache_key, listing, catalog_cache_timeout())
+        current_page, cursor_mode = listing
+
+        # Остаток не кэшируется вместе со страницей: резервы меняют его
+        # без изменения товара
+        stock = available_stock([product.id for product in current_page])
+        for product in current_page:
+            product.available = stock.get(product.id, 0)
 
         context = {
             "title": "Каталог",
             "goods": current_page,
-            'slug_url': category_slug
+            'slug_url': category_slug,
+            'cursor_mode': cursor_mode,
+            'facets': facets,
         }
         return render(request, "goods/catalog.html", context)
 
+    def get_listing(self, goods, order_by, page, cursor, cursor_mode):
+        """
+        Разбивает отфильтрованный набор товаров на страницы.
+
+        Returns:
+            tuple: Текущая страница, отвязанная от QuerySet, и признак
+                   пагинации по курсору.
+        """
+        # Пагинация
+        ordering = CATALOG_ORDERINGS[order_by]
+        if cursor_mode:
+            paginator = KeysetPaginator(goods, self.paginate_by, ordering)
+            try:
+                current_page = paginator.page(cursor)
+            except InvalidCursor:
+                current_page = paginator.page()  # Первая страница
+        else:
+            paginator = Paginator(goods, self.paginate_by)
+            # Получение текущей страницы; некорректный номер дает первую
+            # или последнюю страницу вместо ошибки
+            current_page = paginator.get_page(page)
+        return detach_page(current_page), cursor_mode
+
+
+def product_available(request, product):
+    """
+    Возвращает доступный остаток товара.
+
+    Остаток нужен и для ETag, и для самой страницы, поэтому запоминается
+    в запросе и читается из БД один раз.
+    """
+    if not hasattr(request, '_product_available'):
+        request._product_available = available_stock(
+            [product.pk]).get(product.pk, 0)
+    return request._product_available
+
+
+def product_etag(request, product_slug):
+    """
+    Возвращает ETag страницы товара.
+
+    Кроме версии товара учитывает доступный остаток, пользователя, сводку
+    корзины и CSRF-cookie, так как страница содержит остаток, значок
+    корзины и CSRF-токен.
+    """
+    product = get_cached_product(product_slug)
+    if product is None:
+        return None
+    summary = get_cart_summary(request)
+    return '-'.join(str(part) for part in (
+        product.pk,
+        product.updated_at.timestamp(),
+        product_available(request, product),
+        request.user.pk,
+        summary['total_quantity'],
+        summary['total_price'],
+        request.COOKIES.get(settings.CSRF_COOKIE_NAME, ''),
+    ))
+
 
+# Last-Modified не отдается: страница зависит не только от товара, но и
+# от остатка, корзины и пользователя, и запрос только с If-Modified-Since
+# получал бы 304 с устаревшими данными
+@method_decorator(condition(etag_func=product_etag), name='get')
 class ProductView(View):
     """
     Представление для отображения деталей продукта.
 
-    Показывает подробную информацию о конкретном товаре.
+    Показывает подробную информацию о конкретном товаре. Товар берется из
+    кэша, а ответ снабжается заголовком ETag, поэтому повторные запросы
+    браузера или CDN с If-None-Match получают 304 Not Modified.
 
     Args:
         request (HttpRequest): объект запроса от пользователя.
@@ -67,8 +202,56 @@ class ProductView(View):
 
     def get(self, request, product_slug):
         # Получение продукта по слагу или возврат 404, если продукт не найден
-        product = Products.objects.get(slug=product_slug)
+        product = get_cached_product(product_slug)
+        if product is None:
+            raise Http404('Товар не найден')
         context = {
-            'product': product
+            'product': product,
+            'available': product_available(request, product),
         }
         return render(request, "goods/product.html", context)
+
+
+class SuggestView(View):
+    """
+    Представление подсказок для строки поиска.
+
+    Возвращает JSON с названиями и слагами товаров, начинающихся с
+    введенного префикса. Подсказки берутся из префиксного индекса в памяти
+    и не затрагивают полнотекстовый поиск.
+
+    Args:
+        request (HttpRequest): объект запроса от пользователя.
+    """
+    limit = 10  # Количество подсказок по умолчанию
+    max_limit = 20
+
+    def get(self, request):
+        prefix = request.GET.get('q', '')
+        try:
+            limit = min(int(request.GET.get('limit', self.limit)),
+                        self.max_limit)
+        except ValueError:
+            limit = self.limit
+        results = [
+            {'name': name, 'slug': slug}
+            for name, slug in suggest_products(prefix, limit)
+        ]
+        return JsonResponse({'results': results})
+
+
+@method_decorator(staff_member_required, name='dispatch')
+class SearchCacheStatsView(View):
+    """
+    Представление статистики кэша поиска текущего процесса.
+
+    Отдает сотрудникам счетчики попаданий и промахов, а также размер
+    кэша, чтобы подобрать SEARCH_CACHE_SIZE и SEARCH_CACHE_TTL.
+
+    Args:
+        request (HttpRequest): объект запроса от пользователя.
+    """
+
+    def get(self, request):
+        info = search_cache.cache_info()
+        return JsonResponse({**info._asdict(), 'ttl': search_cache.ttl})
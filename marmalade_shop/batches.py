@@ -0,0 +1,134 @@
+import time
+from abc import ABCMeta, abstractmethod
+
+from django.core.management.base import BaseCommand
+
+
+def keyset_batches(queryset, field, batch_size):
+    """
+    Перебирает различные значения поля набора пакетами по возрастанию.
+
+    Каждый пакет читается одним запросом по диапазону индекса поля,
+    начиная после последнего значения предыдущего пакета, поэтому чтение
+    пакета не замедляется по мере обработки таблицы, а обработка может
+    изменять строки пакета.
+
+    Args:
+        queryset (QuerySet): Обрабатываемые строки.
+        field (str): Поле с индексом, например 'id'.
+        batch_size (int): Количество значений в одном пакете.
+
+    Yields:
+        list: Значения поля очередного пакета.
+    """
+    last = None
+    while True:
+        batch = queryset.order_by(field)
+        if last is not None:
+            batch = batch.filter(**{f'{field}__gt': last})
+        keys = list(
+            batch.values_list(field, flat=True).distinct()[:batch_size])
+        if not keys:
+            return
+        yield keys
+        last = keys[-1]
+
+
+def head_batches(queryset, field, batch_size):
+    """
+    Перебирает id строк из начала индекса поля пакетами.
+
+    Подходит для удаления: обработанные строки выпадают из набора, поэтому
+    каждый пакет снова читается с начала диапазона индекса. Обработка
+    пакета обязана выводить его строки из набора, иначе перебор не
+    закончится.
+
+    Args:
+        queryset (QuerySet): Обрабатываемые строки.
+        field (str): Поле с индексом, по которому упорядочены пакеты.
+        batch_size (int): Количество строк в одном пакете.
+
+    Yields:
+        list: id строк очередного пакета.
+    """
+    while True:
+        ids = list(queryset.order_by(field)
+                   .values_list('id', flat=True)[:batch_size])
+        if not ids:
+            return
+        yield ids
+
+
+def run_batches(batches, process, pause=0, progress=None, total=0):
+    """
+    Обрабатывает пакеты по одному, каждый в своем коротком запросе.
+
+    Args:
+        batches (iterable): Пакеты, например из keyset_batches().
+        process (callable): Обрабатывает пакет и возвращает количество
+                            измененных строк.
+        pause (float): Пауза между пакетами, в секундах.
+        progress (callable, optional): Вызывается после каждого пакета с
+                                       количеством обработанных строк.
+        total (int): Начальное значение счетчика, например результат
+                     предыдущего прохода.
+
+    Returns:
+        int: Количество обработанных строк с учетом total.
+    """
+    for batch in batches:
+        total += process(batch)
+        if progress is not None:
+            progress(total)
+        if pause:
+            time.sleep(pause)
+    return total
+
+
+class BatchCommand(BaseCommand, metaclass=ABCMeta):
+    """
+    Базовая команда пакетной обработки таблицы.
+
+    Добавляет параметры --batch-size и --pause, выводит ход работы после
+    каждого пакета и итог со временем работы. Наследник реализует
+    process() и задает тексты сообщений.
+    """
+    # Подпись счетчика после каждого пакета
+    progress_label = 'Обработано строк'
+    # Итоговое сообщение; получает total и elapsed
+    done_message = 'Готово, всего строк: {total}, за {elapsed:.2f} с'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--batch-size', type=int, default=1000,
+            help='Количество строк в одном пакете')
+        parser.add_argument(
+            '--pause', type=float, default=0,
+            help='Пауза между пакетами, в секундах')
+
+    def handle(self, *args, **options):
+        started = time.monotonic()
+        total = self.process(
+            progress=lambda count: self.stdout.write(
+                f'{self.progress_label}: {count}'),
+            **options)
+        elapsed = time.monotonic() - started
+
+        self.stdout.write(self.style.SUCCESS(
+            self.done_message.format(total=total, elapsed=elapsed)))
+
+    @abstractmethod
+    def process(self, batch_size, pause, progress, **options):
+        """
+        Выполняет обработку.
+
+        Args:
+            batch_size (int): Количество строк в одном пакете.
+            pause (float): Пауза между пакетами, в секундах.
+            progress (callable): Вызывается после каждого пакета с
+                                 количеством обработанных строк.
+            **options: Остальные параметры команды.
+
+        Returns:
+            int: Количество обработанных строк.
+        """
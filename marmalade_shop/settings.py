@@ -57,6 +57,7 @@ MIDDLEWARE = [
     'django.middleware.common.CommonMiddleware',
     'django.middleware.csrf.CsrfViewMiddleware',
     'django.contrib.auth.middleware.AuthenticationMiddleware',
+    'carts.middleware.CartMiddleware',
     'django.contrib.messages.middleware.MessageMiddleware',
     'django.middleware.clickjacking.XFrameOptionsMiddleware',
 
@@ -99,6 +100,38 @@ DATABASES = {
 }
 
 
+# Cache
+# https://docs.djangoproject.com/en/4.2/topics/cache/
+# Версии кэша каталога должны быть общими для всех процессов, поэтому в
+# продакшене здесь нужен общий бэкенд, например RedisCache.
+
+CACHES = {
+    'default': {
+        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+    }
+}
+
+# Время жизни закэшированных страниц каталога, в секундах
+CATALOG_CACHE_TIMEOUT = 60 * 15
+# Время жизни отметки об отсутствии товара, в секундах
+PRODUCT_NOT_FOUND_CACHE_TIMEOUT = 60
+# Размер и время жизни (в секундах) кэша популярных поисковых запросов
+SEARCH_CACHE_SIZE = 256
+SEARCH_CACHE_TTL = 60 * 5
+
+# Хранилище корзин анонимных посетителей: 'session' — словарь
+# {id товара: количество} в сессии, 'db' — строки таблицы cart по ключу
+# сессии. Корзина из сессии переносится в БД при входе или регистрации;
+# с SESSION_ENGINE на кэше анонимная корзина совсем не обращается к БД.
+CART_ANONYMOUS_BACKEND = 'session'
+# Время жизни сводки корзины пользователя для значка в шапке, в секундах;
+# ограничивает устаревание сводки после изменения цен товаров
+CART_SUMMARY_TIMEOUT = 60 * 15
+# Время, на которое товары корзины резервируются при переходе к
+# оформлению заказа, в секундах
+STOCK_RESERVATION_TTL = 60 * 15
+
+
 # Password validation
 # https://docs.djangoproject.com/en/4.2/ref/settings/#auth-password-validators
 
@@ -1,6 +1,8 @@
 from django.contrib import admin
 
-from orders.models import Order, OrderItem
+from orders.models import (
+    Order, OrderItem, OutboxMessage, StockReservation
+)
 
 
 class OrderItemTabulareAdmin(admin.TabularInline):
@@ -66,3 +68,22 @@ class OrderAdmin(admin.ModelAdmin):
         "is_paid",
     )
     inlines = (OrderItemTabulareAdmin,)
+
+
+@admin.register(StockReservation)
+class StockReservationAdmin(admin.ModelAdmin):
+    list_display = "user", "product", "quantity", "expires_at"
+    list_filter = ("expires_at",)
+
+
+@admin.register(OutboxMessage)
+class OutboxMessageAdmin(admin.ModelAdmin):
+    list_display = (
+        "id",
+        "topic",
+        "attempts",
+        "available_at",
+        "processed_at",
+    )
+    list_filter = ("topic",)
+    readonly_fields = ("created_at",)
@@ -14,6 +14,9 @@ class CreateOrderForm(forms.Form):
         ],
     )
     delivery_address = forms.CharField(required=False)
+    # Ключ отправки формы, выдается при открытии страницы оформления
+    idempotency_key = forms.CharField(
+        required=False, max_length=64, widget=forms.HiddenInput)
     payment_on_get = forms.ChoiceField(
         choices=[
             ("0", 'False'),
@@ -0,0 +1,50 @@
+from decimal import Decimal
+
+from django.db.models import DecimalField, F, OuterRef, Subquery, Sum, Value
+from django.db.models.functions import Coalesce
+
+from marmalade_shop.batches import BatchCommand, keyset_batches, run_batches
+from orders.models import Order, OrderItem
+
+
+class Command(BatchCommand):
+    """
+    Команда для заполнения сохраненных итогов заказов.
+
+    Нужна для заказов, оформленных до появления полей total_price и
+    items_count. Итоги считаются по сохраненным ценам позиций и
+    записываются пакетами по возрастанию id, по одному UPDATE на пакет.
+    """
+    help = 'Заполняет сумму и количество товаров у заказов пакетами'
+    progress_label = 'Обновлено заказов'
+    done_message = ('Итоги заказов заполнены, всего обновлено: {total}, '
+                    'за {elapsed:.2f} с')
+
+    def add_arguments(self, parser):
+        super().add_arguments(parser)
+        parser.add_argument(
+            '--all', action='store_true',
+            help='Пересчитать итоги у всех заказов, а не только у пустых')
+
+    def process(self, batch_size, pause, progress, **options):
+        orders = Order.objects.all()
+        if not options['all']:
+            orders = orders.filter(items_count=0)
+
+        items = OrderItem.objects.filter(
+            order=OuterRef('pk')).order_by().values('order')
+        total_price = items.annotate(
+            total=Sum(F('price') * F('quantity'),
+                      output_field=DecimalField())).values('total')
+        items_count = items.annotate(
+            count=Sum('quantity')).values('count')
+
+        return run_batches(
+            keyset_batches(orders, 'id', batch_size),
+            lambda ids: Order.objects.filter(id__in=ids).update(
+                total_price=Coalesce(
+                    Subquery(total_price), Value(Decimal('0.00')),
+                    output_field=DecimalField()),
+                items_count=Coalesce(Subquery(items_count), 0),
+            ),
+            pause=pause, progress=progress)
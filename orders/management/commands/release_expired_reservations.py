@@ -0,0 +1,19 @@
+from marmalade_shop.batches import BatchCommand
+from orders.utils import release_expired_reservations
+
+
+class Command(BatchCommand):
+    """
+    Команда для удаления истекших резервов товаров.
+
+    Работает пакетами по индексу expires_at, поэтому ее можно запускать
+    на работающем магазине, например по cron каждые несколько минут.
+    """
+    help = 'Удаляет истекшие резервы товаров пакетами'
+    progress_label = 'Удалено резервов'
+    done_message = ('Истекшие резервы удалены, всего: {total}, '
+                    'за {elapsed:.2f} с')
+
+    def process(self, batch_size, pause, progress, **options):
+        return release_expired_reservations(
+            batch_size=batch_size, pause=pause, progress=progress)
@@ -0,0 +1,46 @@
+from django.core.management.base import BaseCommand
+
+from orders.outbox import run_worker
+
+
+class Command(BaseCommand):
+    """
+    Команда для выполнения заданий исходящей очереди.
+
+    Забирает задания пакетами через SELECT ... FOR UPDATE SKIP LOCKED,
+    поэтому можно запускать несколько воркеров одновременно. Обработчики
+    выполняются в пуле потоков, неудачные задания повторяются с
+    экспоненциальной задержкой.
+    """
+    help = 'Выполняет задания исходящей очереди (outbox)'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--workers', type=int, default=4,
+            help='Количество потоков для выполнения заданий')
+        parser.add_argument(
+            '--batch-size', type=int, default=20,
+            help='Количество заданий, забираемых за раз')
+        parser.add_argument(
+            '--max-attempts', type=int, default=10,
+            help='Максимальное количество попыток задания')
+        parser.add_argument(
+            '--poll-interval', type=float, default=1.0,
+            help='Пауза при пустой очереди, в секундах')
+        parser.add_argument(
+            '--once', action='store_true',
+            help='Выполнить доступные задания и завершиться')
+
+    def handle(self, *args, **options):
+        try:
+            done, failed = run_worker(
+                workers=options['workers'],
+                batch_size=options['batch_size'],
+                max_attempts=options['max_attempts'],
+                poll_interval=options['poll_interval'],
+                once=options['once'],
+            )
+        except KeyboardInterrupt:
+            return
+        self.stdout.write(self.style.SUCCESS(
+            f'Выполнено заданий: {done}, с ошибкой: {failed}'))
@@ -1,4 +1,7 @@
+from decimal import Decimal
+
 from django.db import models
+from django.utils import timezone
 
 
 from goods.models import Products
@@ -6,17 +9,6 @@ from goods.models import Products
 from users.models import User
 
 
-class OrderitemQueryset(models.QuerySet):
-
-    def total_price(self):
-        return sum(cart.products_price() for cart in self)
-
-    def total_quantity(self):
-        if self:
-            return sum(cart.quantity for cart in self)
-        return 0
-
-
 class Order(models.Model):
     user = models.ForeignKey(
         to=User,
@@ -38,11 +30,26 @@ class Order(models.Model):
     is_paid = models.BooleanField(default=False, verbose_name="Оплачено")
     status = models.CharField(
         max_length=50, default='В обработке', verbose_name="Статус заказа")
+    # Итоги заказа сохраняются при оформлении, чтобы история заказов не
+    # пересчитывала их по позициям
+    total_price = models.DecimalField(
+        max_digits=10, decimal_places=2, default=Decimal('0.00'),
+        verbose_name="Сумма заказа")
+    items_count = models.PositiveIntegerField(
+        default=0, verbose_name="Количество товаров")
+    # Ключ отправки формы заказа: повторная отправка не создает дубликат
+    idempotency_key = models.CharField(
+        max_length=64, unique=True, null=True, blank=True,
+        verbose_name="Ключ идемпотентности")
 
     class Meta:
         db_table = "order"
         verbose_name = "Заказ"
         verbose_name_plural = "Заказы"
+        indexes = [
+            # История заказов пользователя от новых к старым
+            models.Index(fields=["user", "-id"], name="order_user_id_idx"),
+        ]
 
     def __str__(self):
         return f"Заказ № {self.pk} --- Покупатель {self.user.first_name} {self.user.last_name}"
@@ -70,10 +77,83 @@ class OrderItem(models.Model):
         verbose_name = "Проданный товар"
         verbose_name_plural = "Проданные товары"
 
-    objects = OrderitemQueryset.as_manager()
-
     def products_price(self):
-        return round(self.product.discounted_price() * self.quantity, 2)
+        return round(self.price * self.quantity, 2)
+
+    def __str__(self):
+        return f"Товар {self.name} --- Заказ № {self.order_id}"
+
+
+class StockReservation(models.Model):
+    """
+    Временный резерв товара под оформляемый заказ.
+
+    Создается при открытии страницы оформления заказа и действует до
+    expires_at; пока резерв активен, зарезервированное количество
+    недоступно другим покупателям. При оформлении заказа резерв
+    превращается в списание со склада, истекшие резервы удаляются
+    командой release_expired_reservations.
+    """
+    user = models.ForeignKey(
+        to=User, on_delete=models.CASCADE, verbose_name="Пользователь")
+    product = models.ForeignKey(
+        to=Products, on_delete=models.CASCADE, verbose_name="Продукт")
+    quantity = models.PositiveIntegerField(verbose_name="Количество")
+    expires_at = models.DateTimeField(verbose_name="Действует до")
+
+    class Meta:
+        db_table = "stock_reservation"
+        verbose_name = "Резерв товара"
+        verbose_name_plural = "Резервы товаров"
+        constraints = [
+            models.UniqueConstraint(
+                fields=["user", "product"],
+                name="reservation_user_product_unique"),
+        ]
+        indexes = [
+            # Сумма активных резервов товара
+            models.Index(fields=["product", "expires_at"],
+                         name="reservation_product_idx"),
+            # Поиск истекших резервов
+            models.Index(fields=["expires_at"],
+                         name="reservation_expires_idx"),
+        ]
+
+    def __str__(self):
+        return (f"Резерв товара {self.product_id} --- "
+                f"Количество {self.quantity}")
+
+
+class OutboxMessage(models.Model):
+    """
+    Задание в исходящей очереди (transactional outbox).
+
+    Записывается в той же транзакции, что и заказ, поэтому задание
+    появляется тогда и только тогда, когда заказ сохранен. Задания
+    выполняет команда run_outbox_worker, см. orders.outbox.
+    """
+    topic = models.CharField(max_length=100, verbose_name="Тип задания")
+    payload = models.JSONField(default=dict, verbose_name="Данные")
+    created_at = models.DateTimeField(
+        auto_now_add=True, verbose_name="Дата создания")
+    available_at = models.DateTimeField(
+        default=timezone.now, verbose_name="Доступно для выполнения с")
+    attempts = models.PositiveIntegerField(
+        default=0, verbose_name="Количество попыток")
+    last_error = models.TextField(blank=True, verbose_name="Последняя ошибка")
+    processed_at = models.DateTimeField(
+        null=True, blank=True, verbose_name="Дата выполнения")
+
+    class Meta:
+        db_table = "outbox"
+        verbose_name = "Задание очереди"
+        verbose_name_plural = "Очередь заданий"
+        indexes = [
+            # Частичный индекс невыполненных заданий для выборки воркером
+            models.Index(fields=["available_at"],
+                         condition=models.Q(processed_at__isnull=True),
+                         name="outbox_pending_idx"),
+        ]
 
     def __str__(self):
-        return f"Товар {self.name} --- Заказ № {self.order.pk}"
+        return f"Задание {self.topic} --- № {self.pk}"
@@ -0,0 +1,200 @@
+import logging
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from datetime import timedelta
+
+from django.core.mail import send_mail
+from django.db import close_old_connections, connection, transaction
+from django.db.models import F
+from django.utils import timezone
+
+from orders.models import Order, OutboxMessage
+
+
+logger = logging.getLogger(__name__)
+
+# Обработчики заданий по типу
+HANDLERS = {}
+
+# Сколько времени задание считается занятым воркером; если воркер упал,
+# задание снова станет доступным по истечении этого срока
+CLAIM_TIMEOUT = timedelta(minutes=5)
+# Задержка перед повтором: BACKOFF_BASE * 2 ** (попытка - 1), не больше
+# BACKOFF_MAX
+BACKOFF_BASE = timedelta(seconds=10)
+BACKOFF_MAX = timedelta(hours=1)
+
+
+def register(topic):
+    """
+    Декоратор, регистрирующий обработчик заданий типа topic.
+
+    Обработчик получает payload задания. Он может быть вызван повторно
+    после сбоя, поэтому должен быть идемпотентным.
+    """
+    def decorator(handler):
+        HANDLERS[topic] = handler
+        return handler
+    return decorator
+
+
+def enqueue(topic, payload):
+    """
+    Добавляет задание в очередь одним INSERT.
+
+    Вызывается внутри транзакции, изменения которой задание описывает.
+
+    Args:
+        topic (str): Тип задания, для него должен быть обработчик.
+        payload (dict): Данные задания, сериализуемые в JSON.
+
+    Returns:
+        OutboxMessage: Созданное задание.
+    """
+    return OutboxMessage.objects.create(topic=topic, payload=payload)
+
+
+def backoff(attempts):
+    return min(BACKOFF_BASE * 2 ** (attempts - 1), BACKOFF_MAX)
+
+
+def claim_batch(batch_size, max_attempts):
+    """
+    Забирает пакет доступных заданий.
+
+    Задания отбираются SELECT ... FOR UPDATE SKIP LOCKED, поэтому
+    несколько воркеров не получат одно и то же задание и не ждут друг
+    друга. Забранные задания откладываются на CLAIM_TIMEOUT и получают
+    новую попытку, после чего транзакция сразу фиксируется.
+
+    Args:
+        batch_size (int): Максимальное количество заданий.
+        max_attempts (int): Задания, исчерпавшие попытки, не забираются.
+
+    Returns:
+        list: Задания OutboxMessage.
+    """
+    now = timezone.now()
+    with transaction.atomic():
+        messages = list(
+            OutboxMessage.objects.select_for_update(skip_locked=True)
+            .filter(processed_at__isnull=True, available_at__lte=now,
+                    attempts__lt=max_attempts)
+            .order_by('available_at')[:batch_size]
+        )
+        OutboxMessage.objects.filter(
+            id__in=[message.id for message in messages]
+        ).update(available_at=now + CLAIM_TIMEOUT, attempts=F('attempts') + 1)
+    for message in messages:
+        message.attempts += 1
+    return messages
+
+
+def run_message(message):
+    """
+    Выполняет обработчик задания в потоке пула.
+
+    Returns:
+        str | None: Текст ошибки или None при успехе.
+    """
+    try:
+        handler = HANDLERS.get(message.topic)
+        if handler is None:
+            return f'Нет обработчика для {message.topic}'
+        handler(message.payload)
+        return None
+    except Exception as error:
+        logger.exception('Задание %s завершилось ошибкой', message.pk)
+        return repr(error)
+    finally:
+        # Соединение с БД у каждого потока свое
+        connection.close()
+
+
+def process_batch(executor, batch_size, max_attempts):
+    """
+    Забирает и выполняет один пакет заданий.
+
+    Обработчики выполняются параллельно в пуле потоков вне транзакции
+    выборки. Выполненные задания отмечаются одним UPDATE, неудачные
+    откладываются с экспоненциальной задержкой.
+
+    Returns:
+        tuple: (выполнено, с ошибкой).
+    """
+    messages = claim_batch(batch_size, max_attempts)
+    if not messages:
+        return 0, 0
+    results = list(zip(messages, executor.map(run_message, messages)))
+
+    now = timezone.now()
+    done = [message.id for message, error in results if error is None]
+    OutboxMessage.objects.filter(id__in=done).update(
+        processed_at=now, last_error='')
+    failed = [(message, error) for message, error in results if error]
+    for message, error in failed:
+        OutboxMessage.objects.filter(id=message.id).update(
+            available_at=now + backoff(message.attempts), last_error=error)
+    return len(done), len(failed)
+
+
+def run_worker(workers=4, batch_size=20, max_attempts=10,
+               poll_interval=1.0, once=False, stop=None):
+    """
+    Запускает обработку очереди.
+
+    Ошибка итерации (например, потеря соединения с БД) записывается в
+    лог и не останавливает воркер: соединения закрываются, и после паузы
+    poll_interval обработка продолжается. Задания, забранные в сбойной
+    итерации, снова станут доступны через CLAIM_TIMEOUT.
+
+    Args:
+        workers (int): Размер пула потоков.
+        batch_size (int): Количество заданий, забираемых за раз.
+        max_attempts (int): Максимальное количество попыток задания.
+        poll_interval (float): Пауза при пустой очереди, в секундах.
+        once (bool): Выполнить доступные задания и завершиться.
+        stop (threading.Event, optional): Событие остановки воркера.
+
+    Returns:
+        tuple: Итоговые (выполнено, с ошибкой).
+    """
+    stop = stop or threading.Event()
+    total_done = total_failed = 0
+    with ThreadPoolExecutor(max_workers=workers) as executor:
+        while not stop.is_set():
+            try:
+                done, failed = process_batch(
+                    executor, batch_size, max_attempts)
+            except Exception:
+                logger.exception('Ошибка обработки очереди заданий')
+                close_old_connections()
+                if once:
+                    break
+                stop.wait(poll_interval)
+                continue
+            total_done += done
+            total_failed += failed
+            if done or failed:
+                continue
+            if once:
+                break
+            stop.wait(poll_interval)
+    return total_done, total_failed
+
+
+@register('order_created')
+def send_order_confirmation(payload):
+    """
+    Отправляет покупателю письмо о принятом заказе.
+    """
+    order = Order.objects.select_related('user').get(id=payload['order_id'])
+    if order.user is None or not order.user.email:
+        return
+    send_mail(
+        subject=f'Заказ № {order.id} оформлен',
+        message=(f'Заказ № {order.id} на сумму {order.total_price} ₽ '
+                 f'принят в обработку.'),
+        from_email=None,
+        recipient_list=[order.user.email],
+    )
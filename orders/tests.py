@@ -1,3 +1,182 @@
-from django.test import TestCase
+import threading
+import uuid
+from unittest import mock
 
-# Create your tests here.
+from django.db import DatabaseError, connection
+from django.test import (
+    Client, SimpleTestCase, TransactionTestCase, skipUnlessDBFeature
+)
+from django.urls import reverse
+from django.utils import timezone
+
+from carts.models import Cart
+from goods.testing import create_product
+from orders.models import Order, OrderItem
+from orders.outbox import HANDLERS, enqueue, run_worker
+from users.models import User
+
+
+# Данные формы оформления заказа
+ORDER_DATA = {
+    'first_name': 'Имя',
+    'last_name': 'Фамилия',
+    'phone_number': '9001234567',
+    'requires_delivery': '0',
+    'payment_on_get': '1',
+}
+
+
+@skipUnlessDBFeature('has_select_for_update')
+class ConcurrentCheckoutTest(TransactionTestCase):
+    """
+    Одновременные заказы не должны продавать больше, чем есть на складе.
+    """
+    buyers = 8
+    stock = 5
+
+    def setUp(self):
+        self.product = create_product(quantity=self.stock)
+        self.users = []
+        for index in range(self.buyers):
+            user = User.objects.create_user(
+                username=f'buyer{index}', password='password')
+            Cart.objects.create(user=user, product=self.product, quantity=1)
+            self.users.append(user)
+
+    def checkout(self, user, barrier):
+        client = Client()
+        client.force_login(user)
+        try:
+            barrier.wait()
+            client.post(reverse('orders:create_order'), ORDER_DATA)
+        finally:
+            connection.close()
+
+    def test_stock_is_not_oversold(self):
+        barrier = threading.Barrier(self.buyers)
+        threads = [
+            threading.Thread(target=self.checkout, args=(user, barrier))
+            for user in self.users
+        ]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+
+        self.product.refresh_from_db()
+        self.assertEqual(self.product.quantity, 0)
+        self.assertEqual(Order.objects.count(), self.stock)
+        self.assertEqual(
+            OrderItem.objects.filter(product=self.product).count(),
+            self.stock)
+        # Покупатели без заказа сохранили корзину
+        self.assertEqual(
+            Cart.objects.count(), self.buyers - self.stock)
+
+
+@skipUnlessDBFeature('has_select_for_update')
+class IdempotentCheckoutTest(TransactionTestCase):
+    """
+    Повторная отправка формы с тем же ключом возвращает уже оформленный
+    заказ и не списывает товар второй раз.
+    """
+    stock = 5
+
+    def setUp(self):
+        self.product = create_product(quantity=self.stock)
+        self.user = User.objects.create_user(
+            username='buyer', password='password')
+        self.data = {**ORDER_DATA, 'idempotency_key': uuid.uuid4().hex}
+
+    def post(self):
+        client = Client()
+        client.force_login(self.user)
+        return client.post(reverse('orders:create_order'), self.data)
+
+    def assertOrderedOnce(self):
+        self.assertEqual(
+            Order.objects.filter(
+                idempotency_key=self.data['idempotency_key']).count(), 1)
+        self.product.refresh_from_db()
+        self.assertEqual(self.product.quantity, self.stock - 1)
+
+    def test_repeated_submission(self):
+        Cart.objects.create(user=self.user, product=self.product, quantity=1)
+        self.assertRedirects(
+            self.post(), reverse('users:profile'),
+            fetch_redirect_response=False)
+        # Товар снова в корзине, но повтор не оформляет его
+        Cart.objects.create(user=self.user, product=self.product, quantity=1)
+        self.assertRedirects(
+            self.post(), reverse('users:profile'),
+            fetch_redirect_response=False)
+
+        self.assertOrderedOnce()
+        self.assertEqual(Cart.objects.filter(user=self.user).count(), 1)
+
+    def test_concurrent_submissions(self):
+        Cart.objects.create(user=self.user, product=self.product, quantity=1)
+        barrier = threading.Barrier(2)
+        responses = []
+
+        def submit():
+            try:
+                barrier.wait()
+                responses.append(self.post())
+            finally:
+                connection.close()
+
+        threads = [threading.Thread(target=submit) for _ in range(2)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+
+        for response in responses:
+            self.assertRedirects(
+                response, reverse('users:profile'),
+                fetch_redirect_response=False)
+        self.assertOrderedOnce()
+
+
+@skipUnlessDBFeature('has_select_for_update_skip_locked')
+class OutboxRetryTest(TransactionTestCase):
+    """
+    Задание с упавшим обработчиком остается в очереди для повтора.
+    """
+
+    def test_failed_message_is_retryable(self):
+        def fail(payload):
+            raise RuntimeError('SMTP недоступен')
+
+        message = enqueue('test_failure', {})
+        with mock.patch.dict(HANDLERS, {'test_failure': fail}):
+            self.assertEqual(run_worker(workers=1, once=True), (0, 1))
+
+        message.refresh_from_db()
+        self.assertIsNone(message.processed_at)
+        self.assertEqual(message.attempts, 1)
+        self.assertIn('SMTP недоступен', message.last_error)
+        self.assertGreater(message.available_at, timezone.now())
+
+
+class OutboxWorkerTest(SimpleTestCase):
+    """
+    Ошибка итерации не останавливает воркер.
+    """
+
+    def test_worker_survives_batch_error(self):
+        stop = threading.Event()
+        results = iter([DatabaseError('соединение потеряно'), (1, 0)])
+
+        def process_batch(*args):
+            result = next(results)
+            if isinstance(result, Exception):
+                raise result
+            stop.set()
+            return result
+
+        with mock.patch('orders.outbox.process_batch', process_batch), \
+                self.assertLogs('orders.outbox', 'ERROR'):
+            totals = run_worker(workers=1, poll_interval=0, stop=stop)
+        self.assertEqual(totals, (1, 0))
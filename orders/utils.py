@@ -0,0 +1,74 @@
+from datetime import timedelta
+
+from django.conf import settings
+from django.db import transaction
+from django.utils import timezone
+
+from goods.models import Products
+from goods.utils import with_available_stock
+from marmalade_shop.batches import head_batches, run_batches
+from orders.models import StockReservation
+
+
+def reservation_ttl():
+    return getattr(settings, 'STOCK_RESERVATION_TTL', 60 * 15)
+
+
+def reserve_stock(user, lines):
+    """
+    Резервирует товары корзины пользователя на STOCK_RESERVATION_TTL.
+
+    Заменяет прежние резервы пользователя. Товары блокируются в порядке
+    id, как и при оформлении заказа, поэтому два покупателя не
+    зарезервируют одну и ту же единицу. Если товара не хватает,
+    резервируется доступный остаток.
+
+    Args:
+        user (User): Покупатель.
+        lines (dict): Количество в корзине по id товара.
+
+    Returns:
+        dict: Зарезервированное количество по товару (Products).
+    """
+    expires_at = timezone.now() + timedelta(seconds=reservation_ttl())
+    with transaction.atomic():
+        products = with_available_stock(
+            Products.objects.select_for_update(of=('self',))
+            .filter(id__in=lines).order_by('pk'),
+            exclude_user=user,
+        )
+        reserved = {
+            product: max(0, min(lines[product.id], product.available))
+            for product in products
+        }
+        StockReservation.objects.filter(user=user).delete()
+        StockReservation.objects.bulk_create([
+            StockReservation(user=user, product=product, quantity=quantity,
+                             expires_at=expires_at)
+            for product, quantity in reserved.items() if quantity
+        ])
+    return reserved
+
+
+def release_expired_reservations(batch_size=1000, pause=0, progress=None):
+    """
+    Удаляет истекшие резервы пакетами.
+
+    Истекшие резервы уже не влияют на доступный остаток, поэтому удаление
+    нужно только чтобы таблица не росла. Пакеты отбираются по индексу
+    expires_at и ограничены batch_size строками.
+
+    Args:
+        batch_size (int): Количество строк в одном пакете.
+        pause (float): Пауза между пакетами, в секундах.
+        progress (callable, optional): Вызывается после каждого пакета с
+                                       количеством удаленных строк.
+
+    Returns:
+        int: Количество удаленных резервов.
+    """
+    expired = StockReservation.objects.filter(expires_at__lte=timezone.now())
+    return run_batches(
+        head_batches(expired, 'expires_at', batch_size),
+        lambda ids: expired.filter(id__in=ids).delete()[0],
+        pause=pause, progress=progress)
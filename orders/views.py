@@ -1,14 +1,25 @@
+import uuid
+from decimal import Decimal
+
 from django.contrib.auth.decorators import login_required
 from django.contrib import messages
-from django.db import transaction
+from django.db import IntegrityError, transaction
+from django.db.models import Case, F, PositiveIntegerField, Q, When
 from django.forms import ValidationError
 from django.shortcuts import redirect, render
 from django.views import View
+from django.utils import timezone
 from django.utils.decorators import method_decorator
 
 from carts.models import Cart
+from carts.utils import forget_cart_summary
+from goods.cache import invalidate_product
+from goods.models import Products
+from goods.utils import with_available_stock
 from orders.forms import CreateOrderForm
-from orders.models import Order, OrderItem
+from orders.models import Order, OrderItem, StockReservation
+from orders.outbox import enqueue
+from orders.utils import reserve_stock
 
 
 @method_decorator(login_required, name='dispatch')
@@ -20,8 +31,23 @@ class CreateOrderView(View):
         initial = {
             'first_name': request.user.first_name,
             'last_name': request.user.last_name,
+            # Новый ключ на каждое открытие страницы оформления
+            'idempotency_key': uuid.uuid4().hex,
         }
         form = self.form_class(initial=initial)
+
+        # Резервируем товары корзины на время оформления заказа, чтобы
+        # о нехватке товара покупатель узнал сразу, а не после отправки
+        lines = dict(Cart.objects.filter(user=request.user)
+                     .values_list('product_id', 'quantity'))
+        if lines:
+            reserved = reserve_stock(request.user, lines)
+            for product, quantity in reserved.items():
+                if quantity < lines[product.id]:
+                    messages.warning(
+                        request,
+                        f'{product.name}: доступно только {quantity} шт.')
+
         context = {
             'title': 'Marmalade-shop - Оформление заказа',
             'form': form,
@@ -30,6 +56,13 @@ class CreateOrderView(View):
         return render(request, self.template_name, context)
 
     def post(self, request, *args, **kwargs):
+        # Повторная отправка формы (двойной клик, повтор запроса прокси)
+        # получает результат первой без транзакции и блокировок
+        key = request.POST.get('idempotency_key')
+        replayed = self.replay(request, key)
+        if replayed:
+            return replayed
+
         form = self.form_class(data=request.POST)
         if form.is_valid():
             try:
@@ -40,39 +73,131 @@ class CreateOrderView(View):
                     if cart_items.exists():
                         order = self.create_order(user, form, cart_items)
                         cart_items.delete()
+                        # Сводка сбрасывается после фиксации, иначе ее
+                        # пересчитали бы по еще не удаленным строкам
+                        transaction.on_commit(
+                            lambda: forget_cart_summary(request))
                         messages.success(request, 'Заказ оформлен.')
                         return redirect('users:profile')
-            except ValidationError as e:
+            except (IntegrityError, ValidationError) as e:
+                # Параллельная отправка с тем же ключом могла успеть
+                # оформить заказ: тогда это повтор, а не ошибка
+                replayed = self.replay(request, key)
+                if replayed:
+                    return replayed
+                if isinstance(e, IntegrityError):
+                    raise
                 messages.error(request, str(e))
-                return redirect('cart:order')
+                return redirect('orders:create_order')
+            replayed = self.replay(request, key)
+            if replayed:
+                return replayed
         return render(request, self.template_name, {'form': form})
 
+    def replay(self, request, key):
+        """
+        Возвращает результат уже оформленного по этому ключу заказа.
+
+        Args:
+            request (HttpRequest): объект запроса от пользователя.
+            key (str): Ключ отправки формы из POST.
+
+        Returns:
+            HttpResponse | None: Перенаправление, как после оформления
+                                 заказа, или None, если заказа с таким
+                                 ключом нет.
+        """
+        if key and Order.objects.filter(
+                user=request.user, idempotency_key=key).exists():
+            return redirect('users:profile')
+        return None
+
     def create_order(self, user, form, cart_items):
+        """
+        Создает заказ из корзины и списывает товары со склада.
+
+        Доступный остаток учитывает активные резервы других покупателей,
+        собственный резерв покупателя при этом превращается в списание.
+        Строки товаров блокируются SELECT ... FOR UPDATE в порядке id,
+        поэтому одновременные заказы с общими товарами ждут друг друга, а
+        не блокируют друг друга взаимно. Позиции заказа создаются одним
+        bulk_create, остатки списываются одним условным UPDATE ... WHERE
+        quantity >= x. Число запросов не зависит от количества позиций.
+
+        Args:
+            user (User): Покупатель.
+            form (CreateOrderForm): Проверенная форма заказа.
+            cart_items (QuerySet): Строки корзины покупателя.
+
+        Returns:
+            Order: Созданный заказ.
+
+        Raises:
+            ValidationError: Если товара не хватает на складе.
+        """
+        lines = dict(cart_items.values_list('product_id', 'quantity'))
+        if not lines:
+            raise ValidationError('Корзина пуста')
+        products = list(with_available_stock(
+            Products.objects.select_for_update(of=('self',))
+            .filter(id__in=lines).order_by('pk'),
+            exclude_user=user,
+        ))
+        for product in products:
+            if product.available < lines[product.id]:
+                raise ValidationError(
+                    f'На складе недостаточно {product.name} '
+                    f'В наличии - {max(product.available, 0)}'
+                )
+
+        items = [
+            OrderItem(
+                product=product,
+                name=product.name,
+                price=product.discounted_price(),
+                quantity=lines[product.id],
+            )
+            for product in products
+        ]
         order = Order.objects.create(
             user=user,
             phone_number=form.cleaned_data['phone_number'],
             requires_delivery=form.cleaned_data['requires_delivery'],
             delivery_address=form.cleaned_data['delivery_address'],
             payment_on_get=form.cleaned_data['payment_on_get'],
+            idempotency_key=form.cleaned_data['idempotency_key'] or None,
+            total_price=sum(
+                (item.products_price() for item in items), Decimal('0.00')),
+            items_count=sum(item.quantity for item in items),
         )
-        for cart_item in cart_items:
-            product = cart_item.product
-            name = product.name
-            price = product.discounted_price()
-            quantity = cart_item.quantity
+        for item in items:
+            item.order = order
+        OrderItem.objects.bulk_create(items)
+        # Побочные действия (письмо покупателю и т. п.) выполняет воркер
+        # очереди после фиксации транзакции
+        enqueue('order_created', {'order_id': order.id})
 
-            if product.quantity < quantity:
-                raise ValidationError(
-                    f'На складе недостаточно {name} В наличии - {product.quantity}'
-                )
+        # Списание остатков одним запросом; условие quantity >= x
+        # защищает от ухода остатка в минус
+        in_stock = Q()
+        for product_id, quantity in lines.items():
+            in_stock |= Q(id=product_id, quantity__gte=quantity)
+        updated = Products.objects.filter(in_stock).update(
+            quantity=Case(
+                *(When(id=product_id, then=F('quantity') - quantity)
+                  for product_id, quantity in lines.items()),
+                default=F('quantity'),
+                output_field=PositiveIntegerField(),
+            ),
+            updated_at=timezone.now(),
+        )
+        if updated != len(lines):
+            raise ValidationError('Товара недостаточно на складе')
+        # Резерв покупателя выполнен
+        StockReservation.objects.filter(user=user).delete()
 
-            OrderItem.objects.create(
-                order=order,
-                product=product,
-                name=name,
-                price=price,
-                quantity=quantity,
-            )
-            product.quantity -= quantity
-            product.save()
+        # update() не вызывает сигналы, поэтому кэш товаров сбрасывается
+        # явно после фиксации транзакции
+        slugs = [product.slug for product in products]
+        transaction.on_commit(lambda: invalidate_product(*slugs))
         return order
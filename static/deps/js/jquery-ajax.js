@@ -8,9 +8,8 @@ $(document).ready(function () {
         // Блокируем его базовое действие
         e.preventDefault();
 
-        // Берем элемент счетчика в значке корзины и берем оттуда значение
+        // Берем элемент счетчика в значке корзины
         var goodsInCartCount = $("#goods-in-cart-count");
-        var cartCount = parseInt(goodsInCartCount.text() || 0);
 
         // Получаем id товара из атрибута data-product-id
         var product_id = $(this).data("product-id");
@@ -35,9 +34,8 @@ $(document).ready(function () {
                     successMessage.fadeOut(400);
                 }, 3000);
 
-                // Увеличиваем количество товаров в корзине (отрисовка в шаблоне)
-                cartCount++;
-                goodsInCartCount.text(cartCount);
+                // Обновляем количество товаров в корзине по ответу сервера
+                goodsInCartCount.text(data.total_quantity);
 
                 // Меняем содержимое корзины на ответ от django (новый отрисованный фрагмент разметки корзины)
                 var cartItemsContainer = $("#cart-items-container");
@@ -56,9 +54,8 @@ $(document).ready(function () {
         // Блокируем его базовое действие
         e.preventDefault();
 
-        // Берем элемент счетчика в значке корзины и берем оттуда значение
+        // Берем элемент счетчика в значке корзины
         var goodsInCartCount = $("#goods-in-cart-count");
-        var cartCount = parseInt(goodsInCartCount.text() || 0);
 
         // Получаем id корзины из атрибута data-cart-id
         var cart_id = $(this).data("cart-id");
@@ -83,9 +80,8 @@ $(document).ready(function () {
                     successMessage.fadeOut(400);
                 }, 3000);
 
-                // Уменьшаем количество товаров в корзине (отрисовка)
-                cartCount -= data.quantity_deleted;
-                goodsInCartCount.text(cartCount);
+                // Обновляем количество товаров в корзине по ответу сервера
+                goodsInCartCount.text(data.total_quantity);
 
                 // Меняем содержимое корзины на ответ от django (новый отрисованный фрагмент разметки корзины)
                 var cartItemsContainer = $("#cart-items-container");
@@ -156,11 +152,8 @@ $(document).ready(function () {
                     successMessage.fadeOut(400);
                 }, 3000);
 
-                // Изменяем количество товаров в корзине
-                var goodsInCartCount = $("#goods-in-cart-count");
-                var cartCount = parseInt(goodsInCartCount.text() || 0);
-                cartCount += change;
-                goodsInCartCount.text(cartCount);
+                // Обновляем количество товаров в корзине по ответу сервера
+                $("#goods-in-cart-count").text(data.total_quantity);
 
                 // Меняем содержимое корзины
                 var cartItemsContainer = $("#cart-items-container");
@@ -186,6 +179,10 @@ $(document).ready(function () {
     $("#modalButton").click(function () {
         $("#exampleModal").appendTo("body");
 
+        // Содержимое корзины загружаем только при открытии окна
+        var cartItemsContainer = $("#cart-items-container");
+        cartItemsContainer.load(cartItemsContainer.data("cart-items-url"));
+
         $("#exampleModal").modal("show");
     });
 
@@ -194,6 +191,49 @@ $(document).ready(function () {
         $("#exampleModal").modal("hide");
     });
 
+    // Подсказки в строке поиска по мере ввода
+    var suggestTimer = null;
+    $(document).on("input", "input[data-suggest-url]", function () {
+        var $input = $(this);
+        var query = $input.val().trim();
+        // Ждем паузы в наборе, чтобы не слать запрос на каждую букву
+        clearTimeout(suggestTimer);
+        if (query.length < 2) {
+            return;
+        }
+        suggestTimer = setTimeout(function () {
+            $.getJSON($input.data("suggest-url"), { q: query }, function (data) {
+                var $list = $("#" + $input.attr("list"));
+                $list.empty();
+                $.each(data.results, function (i, item) {
+                    $list.append($("<option>").val(item.name));
+                });
+            });
+        }, 150);
+    });
+
+    // Подгрузка более старых заказов в профиле
+    $(document).on("click", "#load-more-orders", function () {
+        var $button = $(this);
+        $.getJSON($button.data("orders-url"), { cursor: $button.data("cursor") }, function (data) {
+            $("#accordionExample").append(data.orders_html);
+            if (data.next_cursor) {
+                $button.data("cursor", data.next_cursor);
+            } else {
+                $button.remove();
+            }
+        });
+    });
+
+    // Позиции заказа загружаем при первом раскрытии его панели
+    $(document).on("show.bs.collapse", ".accordion-collapse", function () {
+        var $items = $(this).find(".order-items");
+        if ($items.length && !$items.data("loaded")) {
+            $items.data("loaded", true);
+            $items.load($items.data("order-items-url"));
+        }
+    });
+
     // Обработчик события радиокнопки выбора способа доставки
     $("input[name='requires_delivery']").change(function () {
         var selectedValue = $(this).val();
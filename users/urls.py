@@ -11,6 +11,11 @@ urlpatterns = [
          name='registration'),
     # Профиль пользователя
     path('profile/', views.ProfileView.as_view(), name='profile'),
+    # Подгрузка более старых заказов
+    path('profile/orders/', views.OrdersView.as_view(), name='orders'),
+    # Позиции заказа
+    path('profile/orders/<int:order_id>/', views.OrderItemsView.as_view(),
+         name='order_items'),
     # Корзина пользователя
     path('users-cart/', views.UsersCartView.as_view(), name='users_cart'),
     # Выход пользователя
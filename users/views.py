@@ -1,13 +1,14 @@
 from django.contrib.auth.decorators import login_required
 from django.contrib import auth, messages
-from django.http import HttpResponseRedirect
+from django.http import Http404, HttpResponseRedirect, JsonResponse
 from django.shortcuts import redirect, render
+from django.template.loader import render_to_string
 from django.urls import reverse
 from django.views import View
 from django.utils.decorators import method_decorator
-from django.db.models import Prefetch
 
-from carts.models import Cart
+from carts.utils import move_anonymous_cart
+from goods.paginators import InvalidCursor, KeysetPaginator
 from orders.models import Order, OrderItem
 from users.forms import ProfileForm, UserLoginForm, UserRegistrationForm
 
@@ -46,14 +47,13 @@ class LoginView(View):
             password = request.POST['password']
             user = auth.authenticate(username=username, password=password)
             if user:
+                # auth.login() меняет ключ сессии, сохраняем прежний
+                session_key = request.session.session_key
                 auth.login(request, user)
                 messages.success(
                     request, f'{username}, вы успешно вошли в аккаунт')
-                session_key = request.session.session_key
-                if session_key:
-                    # Обновление корзины при смене сессии
-                    Cart.objects.filter(
-                        session_key=session_key).update(user=user)
+                # Перенос анонимной корзины пользователю
+                move_anonymous_cart(request, user, session_key)
                 return HttpResponseRedirect(
                     request.POST.get('next', reverse('main:index'))
                 )
@@ -94,11 +94,11 @@ class RegistrationView(View):
         form = self.form_class(data=request.POST)
         if form.is_valid():
             user = form.save()
-            auth.login(request, user)
+            # auth.login() меняет ключ сессии, сохраняем прежний
             session_key = request.session.session_key
-            if session_key:
-                # Обновление корзины при смене сессии
-                Cart.objects.filter(session_key=session_key).update(user=user)
+            auth.login(request, user)
+            # Перенос анонимной корзины пользователю
+            move_anonymous_cart(request, user, session_key)
             messages.success(
                 request,
                 f'{user.username}, вы зарегистрировались и вошли в аккаунт'
@@ -123,21 +123,41 @@ class ProfileView(View):
     """
     form_class = ProfileForm
     template_name = 'users/profile.html'
+    # Количество заказов, выводимых сразу и подгружаемых за раз
+    orders_per_page = 10
+
+    @classmethod
+    def get_orders_page(cls, user, cursor=None):
+        """
+        Возвращает страницу истории заказов, от новых к старым.
+
+        Страницы отбираются по курсору с индексом (user, -id) без OFFSET и
+        COUNT(*), позиции заказов не загружаются.
+
+        Args:
+            user (User): Владелец заказов.
+            cursor (str, optional): Курсор next_cursor предыдущей страницы.
+
+        Returns:
+            KeysetPage: Страница заказов.
+
+        Raises:
+            InvalidCursor: Если курсор не удалось разобрать.
+        """
+        paginator = KeysetPaginator(
+            Order.objects.filter(user=user), cls.orders_per_page, ('-id',))
+        return paginator.page(cursor)
 
     def get(self, request):
         """
         Обрабатывает GET запросы, отображает форму профиля с текущими данными
-        пользователя и историей заказов.
+        пользователя и последними заказами.
         """
         form = self.form_class(instance=request.user)
-        orders = Order.objects.filter(user=request.user).prefetch_related(
-            Prefetch("orderitem_set",
-                     queryset=OrderItem.objects.select_related("product"))
-        ).order_by("-id")
         return render(request, self.template_name, {
             'title': 'Home - Кабинет',
             'form': form,
-            'orders': orders
+            'orders': self.get_orders_page(request.user)
         })
 
     def post(self, request):
@@ -153,7 +173,59 @@ class ProfileView(View):
             return HttpResponseRedirect(reverse('user:profile'))
         return render(request, self.template_name, {
             'form': form,
-            'title': 'Home - Кабинет'
+            'title': 'Home - Кабинет',
+            'orders': self.get_orders_page(request.user)
+        })
+
+
+@method_decorator(login_required, name='dispatch')
+class OrdersView(View):
+    """
+    Представление для подгрузки более старых заказов в профиле.
+
+    Возвращает разметку следующей страницы заказов и курсор страницы
+    после нее.
+
+    Args:
+        request (HttpRequest): объект запроса от пользователя.
+    """
+
+    def get(self, request):
+        try:
+            orders = ProfileView.get_orders_page(
+                request.user, request.GET.get('cursor'))
+        except InvalidCursor:
+            return JsonResponse(
+                {"message": "Некорректный курсор"}, status=400)
+        return JsonResponse({
+            "orders_html": render_to_string(
+                "users/includes/orders.html", {"orders": orders},
+                request=request),
+            "next_cursor": orders.next_cursor,
+        })
+
+
+@method_decorator(login_required, name='dispatch')
+class OrderItemsView(View):
+    """
+    Представление с позициями заказа для раскрытой панели истории
+    заказов.
+
+    Позиции выводятся по сохраненным названиям и ценам, без обращения к
+    товарам; доступны только заказы текущего пользователя.
+
+    Args:
+        request (HttpRequest): объект запроса от пользователя.
+        order_id (int): id заказа.
+    """
+
+    def get(self, request, order_id):
+        items = list(OrderItem.objects.filter(
+            order_id=order_id, order__user=request.user).order_by('id'))
+        if not items:
+            raise Http404
+        return render(request, 'users/includes/order_items.html', {
+            'items': items,
         })
 
 